@@ -0,0 +1,555 @@
+import argparse, multiprocessing, os, random, resource, statistics, subprocess, sys, time
+from tempfile import TemporaryDirectory
+from sqlalchemy import create_engine, text
+from res.utils import DBHandler, engine_registry, SiteIndex, PWGenerator, CryptoManager, rekey_vault, Vault, KDFParams, calibrate_iterations
+from res.utils import SQLITE_PROFILES, available_presets, export_vault, import_vault, import_entries, parse_file
+from res.utils import iter_age_report, write_ndjson, backfill_fingerprints
+
+
+def _report(name: str, count: int, elapsed: float, unit: str = "rows") -> None:
+    print(f"{name:<40} {count:>10} {unit} {elapsed:>9.3f} s {count / elapsed:>14,.0f} {unit}/s")
+
+
+def bench_bulk_insert(rows: int = 2000, batch_size: int = 1000) -> None:
+    """
+    Compare per-row DBHandler.save_password with batched DBHandler.save_passwords
+    """
+    data = [(f"site{i}", os.urandom(100), "01.01.2024-00:00:00") for i in range(rows)]
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'single.db')}")
+        start = time.perf_counter()
+        for site, password, date in data:
+            db_handle.save_password(site, password, date)
+        _report("save_password (per row)", rows, time.perf_counter() - start)
+
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'bulk.db')}")
+        start = time.perf_counter()
+        db_handle.save_passwords(iter(data), batch_size=batch_size)
+        _report(f"save_passwords (batch {batch_size})", rows, time.perf_counter() - start)
+
+
+def bench_site_lookup(sizes=(1_000, 100_000, 1_000_000), lookups: int = 1000) -> None:
+    """
+    Measure DBHandler.get_password latency with and without the unique site index (ux_pwdata_site)
+    """
+    for size in sizes:
+        with TemporaryDirectory() as tmp:
+            db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'lookup.db')}")
+            db_handle.save_passwords(((f"site{i}", b"x" * 100, "01.01.2024-00:00:00") for i in range(size)), batch_size=10_000)
+            sites = [f"site{random.randrange(size)}" for _ in range(lookups)]
+
+            start = time.perf_counter()
+            for site in sites:
+                db_handle.get_password(site)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>10} rows  indexed    {elapsed / lookups * 1e6:>10.1f} us/lookup")
+
+            with db_handle._engine.begin() as connection:
+                connection.execute(text("DROP INDEX ux_pwdata_site"))
+            unindexed_lookups = max(lookups * 1000 // size, 10)
+            start = time.perf_counter()
+            for site in sites[:unindexed_lookups]:
+                db_handle.get_password(site)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>10} rows  full scan  {elapsed / unindexed_lookups * 1e6:>10.1f} us/lookup")
+
+
+def bench_site_listing(rows: int = 100_000) -> None:
+    """
+    Compare loading full Password rows with the column projected site listing
+    """
+    from res.utils.db import Password, SessionManager
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'listing.db')}")
+        db_handle.save_passwords(((f"site{i}", os.urandom(200), "01.01.2024-00:00:00") for i in range(rows)), batch_size=10_000)
+
+        start = time.perf_counter()
+        with SessionManager(db_handle._engine) as session:
+            sites = [data.site for data in session.query(Password).filter(Password.site != "MAINPW").all()]
+        _report("full ORM rows", len(sites), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        sites = db_handle.get_all_sites()
+        _report("get_all_sites (projected)", len(sites), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        page = db_handle.get_sites(limit=100, after_id=rows // 2)
+        _report("get_sites (one page of 100)", len(page), time.perf_counter() - start)
+
+
+def bench_engine_registry(handlers: int = 200) -> None:
+    """
+    Compare creating engine and schema for every DBHandler with the shared engine registry
+    """
+    from res.utils.db import Base
+    with TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'registry.db')}"
+        start = time.perf_counter()
+        for _ in range(handlers):
+            engine = create_engine(url)
+            Base.metadata.create_all(bind=engine)
+            with engine.connect() as connection:
+                connection.execute(text("SELECT id, site, date FROM pwdata WHERE site != 'MAINPW'")).all()
+            engine.dispose()
+        _report("create_engine + create_all per handler", handlers, time.perf_counter() - start, "handlers")
+
+        start = time.perf_counter()
+        for _ in range(handlers):
+            DBHandler(url).get_all_sites()
+        _report("shared engine registry", handlers, time.perf_counter() - start, "handlers")
+        print(engine_registry.stats(url))
+        engine_registry.dispose(url)
+
+
+def bench_site_search(sites: int = 100_000) -> None:
+    """
+    Measure SiteIndex build time and latency of every keystroke while typing queries
+    """
+    rng = random.Random(0)
+    words = ["mail", "bank", "shop", "cloud", "git", "news", "game", "work", "home", "forum"]
+    names = [f"{rng.choice(words)}{rng.choice(words)}{i}.example.com" for i in range(sites)]
+
+    start = time.perf_counter()
+    index = SiteIndex(names)
+    _report("build index", sites, time.perf_counter() - start, "sites")
+
+    queries = ["mailbank", "shop1234", "cloudgit", "ample.com/", "orum99"]
+    keystrokes = 0
+    worst = 0.0
+    start = time.perf_counter()
+    for query in queries:
+        for length in range(1, len(query) + 1):
+            keystroke_start = time.perf_counter()
+            index.search(query[:length])
+            worst = max(worst, time.perf_counter() - keystroke_start)
+            keystrokes += 1
+    elapsed = time.perf_counter() - start
+    print(f"{keystrokes} keystrokes  mean {elapsed / keystrokes * 1e3:.3f} ms  worst {worst * 1e3:.3f} ms")
+
+
+def bench_password_generation(passwords: int = 1_000_000, length: int = 12) -> None:
+    """
+    Compare character by character generation with PWGenerator.generate_many
+    """
+    pw_gen = PWGenerator(length)
+    sample = passwords // 20
+    start = time.perf_counter()
+    for _ in range(sample):
+        password = ""
+        for _ in range(length):
+            password += random.choice(pw_gen._all_chars)
+    _report("random.choice per character", sample, time.perf_counter() - start, "passwords")
+
+    start = time.perf_counter()
+    for _ in range(sample):
+        pw_gen.get_random_password()
+    _report("get_random_password", sample, time.perf_counter() - start, "passwords")
+
+    start = time.perf_counter()
+    pw_gen.generate_many(passwords)
+    _report("generate_many", passwords, time.perf_counter() - start, "passwords")
+
+
+def bench_policy_generation(passwords: int = 50_000, length: int = 12) -> None:
+    """
+    Compare regenerating until the policy is met with the one pass policy generator
+    """
+    policy = {"min_lower_case_letters": 2, "min_upper_case_letters": 2, "min_digits": 2, "min_symbols": 2}
+
+    def is_compliant(password):
+        return (sum(c.islower() for c in password) >= 2 and sum(c.isupper() for c in password) >= 2
+                and sum(c.isdigit() for c in password) >= 2 and sum(c in pw_gen._all_chars_list[2] for c in password) >= 2)
+
+    pw_gen = PWGenerator(length)
+    attempts = 0
+    start = time.perf_counter()
+    for _ in range(passwords):
+        while True:
+            attempts += 1
+            if is_compliant(pw_gen.get_random_password()):
+                break
+    _report("regenerate until compliant", passwords, time.perf_counter() - start, "passwords")
+    print(f"{attempts / passwords:.2f} attempts per password")
+
+    pw_gen = PWGenerator(length, **policy)
+    start = time.perf_counter()
+    pw_gen.generate_many(passwords)
+    _report("policy generator", passwords, time.perf_counter() - start, "passwords")
+
+
+def bench_batch_crypto(items: int = 50_000) -> None:
+    """
+    Compare per item Fernet construction with CryptoManager.encrypt_many/decrypt_many
+    """
+    from cryptography.fernet import Fernet
+    crypto = CryptoManager("benchmark", salt=b"benchmark")
+    strings = [f"password{i}" for i in range(items)]
+
+    start = time.perf_counter()
+    tokens = [Fernet(crypto._key).encrypt(string.encode()) for string in strings]
+    _report("new Fernet per encrypt", items, time.perf_counter() - start, "items")
+
+    start = time.perf_counter()
+    for token in tokens:
+        Fernet(crypto._key).decrypt(token)
+    _report("new Fernet per decrypt", items, time.perf_counter() - start, "items")
+
+    for workers in (0, 4):
+        start = time.perf_counter()
+        tokens = list(crypto.encrypt_many(strings, workers=workers))
+        _report(f"encrypt_many (workers={workers})", items, time.perf_counter() - start, "items")
+
+        start = time.perf_counter()
+        for _ in crypto.decrypt_many(tokens, workers=workers):
+            pass
+        _report(f"decrypt_many (workers={workers})", items, time.perf_counter() - start, "items")
+
+
+def bench_rekey(rows: int = 100_000) -> None:
+    """
+    Measure throughput of rekey_vault in process and with a process pool
+    """
+    old_crypto = CryptoManager("old_password")
+    encrypted = list(old_crypto.encrypt_many(f"password{i}" for i in range(rows)))
+    with TemporaryDirectory() as tmp:
+        for workers in (0, os.cpu_count() or 1):
+            db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, f'rekey{workers}.db')}")
+            db_handle._save_reserved_password("MAINPW", old_crypto.encrypt_string("old_password"))
+            db_handle.save_passwords(((f"site{i}", pw, None) for i, pw in enumerate(encrypted)), batch_size=10_000)
+            stats = rekey_vault(db_handle, "old_password", "new_password", workers=workers)
+            _report(f"rekey_vault (workers={workers})", stats.rows, stats.seconds)
+
+
+def bench_password_change(rows: int = 100_000) -> None:
+    """
+    Compare Vault.change_password (data key is encrypted again) with rekey_vault (all rows are encrypted again)
+    """
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'change.db')}")
+        vault = Vault(db_handle)
+        data_crypto = vault.create("password1")
+        db_handle.save_passwords(((f"site{i}", pw, None) for i, pw in
+                                  enumerate(data_crypto.encrypt_many(f"password{i}" for i in range(rows)))), batch_size=10_000)
+
+        start = time.perf_counter()
+        vault.change_password("password1", "password2")
+        print(f"Vault.change_password     {time.perf_counter() - start:>9.3f} s")
+
+        stats = rekey_vault(db_handle, "password2", "password3", workers=0)
+        print(f"rekey_vault               {stats.seconds:>9.3f} s  ({stats.rows} rows)")
+
+
+def bench_kdf_calibration(targets=(0.1, 0.25, 0.5)) -> None:
+    """
+    Calibrate PBKDF2 iterations for target unlock latencies and measure the real derivation time
+    """
+    for target in targets:
+        iterations = calibrate_iterations(target, minimum=1)
+        params = KDFParams.generate(iterations)
+        start = time.perf_counter()
+        params.create_crypto("benchmark")
+        print(f"target {target:.2f} s  iterations {iterations:>9}  derivation {time.perf_counter() - start:.3f} s")
+
+
+def bench_password_verification(count: int = 10_000) -> None:
+    """
+    Compare verifier check with decrypting MAINPW, key is derived once so only the check is measured
+    """
+    main_crypto = CryptoManager("password1", iterations=1000)
+    verifier = main_crypto.verifier()
+    token = main_crypto.encrypt_string("password1")
+
+    start = time.perf_counter()
+    for _ in range(count):
+        main_crypto.verify(verifier)
+    _report("CryptoManager.verify", count, time.perf_counter() - start, "checks")
+
+    start = time.perf_counter()
+    for _ in range(count):
+        main_crypto.decrypt_string(token)
+    _report("CryptoManager.decrypt_string (MAINPW)", count, time.perf_counter() - start, "checks")
+
+
+def bench_archive(rows: int = 100_000) -> None:
+    """
+    Measure export to an encrypted archive and import into a new vault.
+    Peak memory is measured by tracemalloc in a second run, tracing slows the code down.
+    """
+    import tracemalloc
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'export.db')}")
+        data_crypto = Vault(db_handle).create("password1")
+        db_handle.save_passwords(((f"site{i}", pw, None) for i, pw in
+                                  enumerate(data_crypto.encrypt_many(f"password{i}" for i in range(rows)))), batch_size=10_000)
+        archive = os.path.join(tmp, "vault.pwarc")
+        params = KDFParams.generate()
+
+        def run_export():
+            return export_vault(db_handle, data_crypto, archive, "archive", kdf_params=params)
+
+        def run_import():
+            import_db = DBHandler(f"sqlite:///{os.path.join(tmp, f'import{time.perf_counter_ns()}.db')}")
+            return import_vault(import_db, Vault(import_db).create("password2"), archive, "archive")
+
+        for name, run in (("export_vault", run_export), ("import_vault", run_import)):
+            stats = run()
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+            print(f"{name}  {stats.rows:>8} rows {stats.seconds:>7.3f} s {stats.megabytes_per_second:>7.2f} MB/s  "
+                  f"peak {peak:.1f} MiB")
+
+
+def bench_csv_import(rows: int = 100_000) -> None:
+    """
+    Import a CSV export through the parse - encrypt - insert pipeline, in-process and with worker processes
+    """
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.csv")
+        with open(path, "w") as file:
+            file.write("name,url,username,password\n")
+            file.writelines(f"site{i},https://site{i}.com,user{i},password{i}\n" for i in range(rows))
+
+        for workers in (0, os.cpu_count() or 1):
+            db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, f'import{workers}.db')}")
+            data_crypto = Vault(db_handle).create("password1")
+            stats = import_entries(db_handle, data_crypto, parse_file(path), workers=workers)
+            _report(f"import_entries workers={workers}", stats.rows, stats.seconds)
+
+
+def bench_startup(runs: int = 5) -> None:
+    """
+    Cold start time of command line commands compared with importing the GUI (median of runs)
+    """
+    with TemporaryDirectory() as tmp:
+        database = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        commands = {
+            "python -m res generate": [sys.executable, "-m", "res", "generate"],
+            "python -m res list": [sys.executable, "-m", "res", "--database", database, "list"],
+            "import GUI (MainGuiHandler)": [sys.executable, "-c", "from res import MainGuiHandler"],
+        }
+        for name, command in commands.items():
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                times.append(time.perf_counter() - start)
+            print(f"{name:<30} {statistics.median(times):>7.3f} s")
+
+
+def bench_gui_resources(runs: int = 5) -> None:
+    """
+    Compare importing the GUI and registering Qt resources from logo_rc.py and from memory-mapped logo.rcc.
+    Import time is the sum of top level modules reported by -X importtime (median of runs).
+    """
+    code = ("import resource; from res.gui.gui import LoginWindow; from res.gui.resources import load_resources; "
+            "load_resources(); print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    for mode in ("module", "rcc"):
+        import_times, memory = [], []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                                    check=True, env={**os.environ, "PWMANAGER_QT_RESOURCES": mode})
+            # Lines are "import time: self [us] | cumulative | imported package", nested imports are indented
+            rows = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")]
+            import_times.append(sum(int(row[1]) for row in rows[1:] if not row[2].startswith("  ")) / 1e6)
+            memory.append(int(result.stdout.split()[-1]) / 1024)
+        print(f"resources from {mode:<7} import {statistics.median(import_times):>7.3f} s  "
+              f"peak memory {statistics.median(memory):>7.1f} MiB")
+
+
+def bench_sqlite_profiles(rows: int = 2000, reads: int = 5000) -> None:
+    """
+    Compare write and read throughput of SQLite profiles: one commit per save_password,
+    batched save_passwords and get_password lookups
+    """
+    for profile in SQLITE_PROFILES:
+        with TemporaryDirectory() as tmp:
+            db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'profile.db')}", profile=profile)
+            start = time.perf_counter()
+            for i in range(rows):
+                db_handle.save_password(f"site{i}", b"x" * 100, "01.01.2024-00:00:00")
+            _report(f"{profile}: save_password", rows, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            db_handle.save_passwords((f"bulk{i}", b"x" * 100, None) for i in range(rows * 50))
+            _report(f"{profile}: save_passwords", rows * 50, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(reads):
+                db_handle.get_password(f"site{i % rows}")
+            _report(f"{profile}: get_password", reads, time.perf_counter() - start)
+            engine_registry.dispose(f"sqlite:///{os.path.join(tmp, 'profile.db')}")
+
+
+def bench_history(sites: int = 10_000, versions: int = 10, lookups: int = 2000) -> None:
+    """
+    Measure current password lookup and history paging of sites saved many times
+    """
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'history.db')}")
+        start = time.perf_counter()
+        db_handle.save_passwords(((f"site{i}", b"x" * 100, None) for _ in range(versions) for i in range(sites)),
+                                 batch_size=10_000)
+        _report("save_passwords (with history)", sites * versions, time.perf_counter() - start)
+
+        names = [f"site{random.randrange(sites)}" for _ in range(lookups)]
+        start = time.perf_counter()
+        for site in names:
+            db_handle.get_password(site)
+        elapsed = time.perf_counter() - start
+        print(f"get_password             {elapsed / lookups * 1e6:>10.1f} us/lookup")
+
+        start = time.perf_counter()
+        for site in names:
+            db_handle.get_history(site, limit=3)
+        elapsed = time.perf_counter() - start
+        print(f"get_history (3 rows)     {elapsed / lookups * 1e6:>10.1f} us/page")
+
+
+def bench_changed_since(rows: int = 100_000, days: int = 1000) -> None:
+    """
+    Compare indexed timestamp range query with parsing date strings of all sites
+    """
+    from datetime import datetime, timedelta
+    from res.utils.db import DATE_FORMAT
+    start_date = datetime(2022, 1, 1)
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'changed.db')}")
+        db_handle.save_passwords(((f"site{i}", b"x" * 100,
+                                   (start_date + timedelta(days=random.randrange(days))).strftime(DATE_FORMAT))
+                                  for i in range(rows)), batch_size=10_000)
+        since_date = start_date + timedelta(days=days - 30)
+        since = int(since_date.timestamp())
+
+        start = time.perf_counter()
+        changed = list(db_handle.iter_changed(since=since))
+        _report("iter_changed (indexed timestamp)", len(changed), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scanned = [entry for entry in db_handle.iter_sites() if datetime.strptime(entry.date, DATE_FORMAT) >= since_date]
+        _report("iter_sites + parsing date strings", len(scanned), time.perf_counter() - start)
+
+
+def bench_age_report(rows: int = 100_000, days: int = 1000) -> None:
+    """
+    Measure streaming of the password age report of the whole vault as NDJSON
+    """
+    from datetime import datetime, timedelta
+    from io import StringIO
+    from res.utils.db import DATE_FORMAT
+    start_date = datetime(2022, 1, 1)
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'report.db')}")
+        db_handle.save_passwords(((f"site{i}", b"x" * 100,
+                                   (start_date + timedelta(days=random.randrange(days))).strftime(DATE_FORMAT))
+                                  for i in range(rows)), batch_size=10_000)
+
+        start = time.perf_counter()
+        next(iter_age_report(db_handle))
+        _report("first entry of age report", 1, time.perf_counter() - start, unit="entries")
+
+        start = time.perf_counter()
+        count = write_ndjson(iter_age_report(db_handle), StringIO())
+        _report("whole age report as NDJSON", count, time.perf_counter() - start, unit="entries")
+
+        start = time.perf_counter()
+        count = write_ndjson(iter_age_report(db_handle, older_than_days=(datetime.now() - start_date).days - 100), StringIO())
+        _report("age report of first 100 days", count, time.perf_counter() - start, unit="entries")
+
+
+def bench_reused_passwords(rows: int = 20_000, distinct: int = 15_000) -> None:
+    """
+    Compare finding reused passwords by decrypting the whole vault with one GROUP BY query over fingerprints,
+    and measure the fingerprint backfill of a vault saved without fingerprints
+    """
+    from collections import defaultdict
+    data_crypto = CryptoManager.from_key(CryptoManager("benchmark", iterations=1)._key)
+    passwords = [f"password{random.randrange(distinct)}" for _ in range(rows)]
+    with TemporaryDirectory() as tmp:
+        db_handle = DBHandler(f"sqlite:///{os.path.join(tmp, 'reused.db')}")
+        db_handle.save_passwords(((f"site{i}", token, None) for i, token in enumerate(data_crypto.encrypt_many(passwords))),
+                                 batch_size=10_000)
+
+        start = time.perf_counter()
+        sites = defaultdict(list)
+        vault_rows = list(db_handle.iter_rows(include_reserved=False))
+        for row, password in zip(vault_rows, data_crypto.decrypt_many(row.pw for row in vault_rows)):
+            sites[password].append(row.site)
+        decrypted_groups = [group for group in sites.values() if len(group) > 1]
+        _report("decrypt all passwords and group", rows, time.perf_counter() - start)
+
+        for workers in (0, os.cpu_count() or 1):
+            if workers:
+                # Measure the same backfill again in worker processes
+                with db_handle._engine.begin() as connection:
+                    connection.execute(text("UPDATE pwdata SET fingerprint = NULL"))
+            stats = backfill_fingerprints(db_handle, data_crypto, workers=workers)
+            _report(f"backfill_fingerprints ({workers} workers)", stats.rows, stats.seconds)
+
+        start = time.perf_counter()
+        groups = db_handle.get_reused()
+        _report("get_reused (GROUP BY fingerprint)", rows, time.perf_counter() - start)
+        assert len(groups) == len(decrypted_groups)
+
+
+def _measure_kdf(preset: str):
+    """
+    Derive one key in this process and return derivation time and peak memory growth in MiB
+    """
+    params = KDFParams.generate(preset=preset)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    params.create_crypto("benchmark")
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+
+def bench_kdf_presets() -> None:
+    """
+    Measure derivation time and peak memory of every key derivation preset.
+    Every preset runs in a fresh process, so peak memory of one preset does not hide the others.
+    """
+    context = multiprocessing.get_context("spawn")
+    for preset in available_presets():
+        with context.Pool(1) as pool:
+            elapsed, memory = pool.apply(_measure_kdf, (preset,))
+        print(f"{preset:<20} derivation {elapsed:>7.3f} s  peak memory {memory:>8.1f} MiB")
+
+
+BENCHMARKS = {
+    "bulk_insert": bench_bulk_insert,
+    "site_lookup": bench_site_lookup,
+    "site_listing": bench_site_listing,
+    "engine_registry": bench_engine_registry,
+    "site_search": bench_site_search,
+    "password_generation": bench_password_generation,
+    "policy_generation": bench_policy_generation,
+    "batch_crypto": bench_batch_crypto,
+    "rekey": bench_rekey,
+    "password_change": bench_password_change,
+    "kdf_calibration": bench_kdf_calibration,
+    "kdf_presets": bench_kdf_presets,
+    "password_verification": bench_password_verification,
+    "archive": bench_archive,
+    "csv_import": bench_csv_import,
+    "startup": bench_startup,
+    "gui_resources": bench_gui_resources,
+    "sqlite_profiles": bench_sqlite_profiles,
+    "history": bench_history,
+    "changed_since": bench_changed_since,
+    "age_report": bench_age_report,
+    "reused_passwords": bench_reused_passwords,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password manager benchmarks")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark {name}")
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
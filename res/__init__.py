@@ -1 +1,6 @@
-from .gui import MainGuiHandler
\ No newline at end of file
+def __getattr__(name: str):
+    # GUI pulls in PySide6 and compiled resources, it is imported only when it is used
+    if name == "MainGuiHandler":
+        from .gui import MainGuiHandler
+        return MainGuiHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
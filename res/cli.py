@@ -0,0 +1,174 @@
+"""
+Command line interface of the password manager, run it by python -m res.
+Only modules needed by the command are imported - GUI (PySide6) is never imported.
+"""
+from itertools import islice
+from typing import List, Optional
+import argparse, getpass, sys
+
+
+def _read_main_password(args: argparse.Namespace) -> str:
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip("\n")
+    return getpass.getpass("Main password: ")
+
+
+def _open_database(args: argparse.Namespace):
+    from .utils.db import DBHandler, DEFAULT_DATABASE_URL
+    return DBHandler(args.database or DEFAULT_DATABASE_URL)
+
+
+def _unlock(args: argparse.Namespace):
+    """
+    Returns (DBHandler, CryptoManager of the data key)
+
+    Raises:
+        WrongPasswordError: If main password is wrong
+        ValueError: If main password is not set
+    """
+    from .utils.vault import Vault
+
+    db_handle = _open_database(args)
+    vault = Vault(db_handle)
+    if not vault.exists():
+        raise ValueError("Main password is not set - create the vault first")
+    return db_handle, vault.unlock(_read_main_password(args))
+
+
+def _password_generator(args: argparse.Namespace):
+    from .utils.pwgen import PWGenerator
+    return PWGenerator(args.length, symbols=not args.no_symbols, exclude_ambiguous=args.exclude_ambiguous)
+
+
+def cmd_get(args: argparse.Namespace) -> int:
+    db_handle, data_crypto = _unlock(args)
+    password = data_crypto.decrypt_string(db_handle.get_password(args.site))
+    if args.copy:
+        import pyperclip
+        pyperclip.copy(password)
+        print("Password copied!")
+    else:
+        print(password)
+    return 0
+
+
+def cmd_add(args: argparse.Namespace) -> int:
+    db_handle, data_crypto = _unlock(args)
+    if args.generate:
+        password = _password_generator(args).get_random_password()
+        print(password)
+    else:
+        password = getpass.getpass(f"Password of {args.site}: ")
+    db_handle.save_password(args.site, data_crypto.encrypt_string(password), fingerprint=data_crypto.fingerprint(password))
+    return 0
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    db_handle = _open_database(args)
+    if args.search:
+        from .utils.search import SiteIndex
+        sites = SiteIndex().attach(db_handle).search(args.search, args.limit)
+    else:
+        sites = (entry.site for entry in db_handle.iter_sites())
+    for site in sites:
+        print(site)
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    from .utils.importer import import_entries, parse_file
+    entries = parse_file(args.path, args.format)
+    db_handle, data_crypto = _unlock(args)
+    stats = import_entries(db_handle, data_crypto, entries, batch_size=args.batch_size, workers=args.workers)
+    print(f"Imported {stats.rows} passwords ({stats.skipped} skipped) in {stats.seconds:.2f} s")
+    return 0
+
+
+def cmd_report(args: argparse.Namespace) -> int:
+    from .utils.report import iter_age_report, write_ndjson
+    entries = iter_age_report(_open_database(args), older_than_days=args.older_than)
+    write_ndjson(islice(entries, args.limit) if args.limit is not None else entries, sys.stdout)
+    return 0
+
+
+def cmd_reused(args: argparse.Namespace) -> int:
+    if args.backfill:
+        from .utils.fingerprint import backfill_fingerprints
+        db_handle, data_crypto = _unlock(args)
+        stats = backfill_fingerprints(db_handle, data_crypto)
+        print(f"Fingerprinted {stats.rows} passwords in {stats.seconds:.2f} s", file=sys.stderr)
+    else:
+        db_handle = _open_database(args)
+    for sites in db_handle.get_reused():
+        print(", ".join(sites))
+    return 0
+
+
+def cmd_generate(args: argparse.Namespace) -> int:
+    print("\n".join(_password_generator(args).generate_many(args.count)))
+    return 0
+
+
+def _add_generator_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--length", type=int, default=12, help="Length of generated password")
+    parser.add_argument("--no-symbols", action="store_true", help="Generate password without symbols")
+    parser.add_argument("--exclude-ambiguous", action="store_true", help="Do not use characters like 0 and O")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m res", description="Password manager")
+    parser.add_argument("--database", help="Database URL of the vault, default is sqlite:///main.db")
+    parser.add_argument("--password-stdin", action="store_true", help="Read main password from the first line of stdin")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    get_parser = commands.add_parser("get", help="Print password of a site")
+    get_parser.add_argument("site")
+    get_parser.add_argument("--copy", action="store_true", help="Copy password to the clipboard instead of printing it")
+    get_parser.set_defaults(handler=cmd_get)
+
+    add_parser = commands.add_parser("add", help="Save password of a site")
+    add_parser.add_argument("site")
+    add_parser.add_argument("--generate", action="store_true", help="Generate random password and print it")
+    _add_generator_arguments(add_parser)
+    add_parser.set_defaults(handler=cmd_add)
+
+    list_parser = commands.add_parser("list", help="Print site names")
+    list_parser.add_argument("--search", help="Print only sites containing the text")
+    list_parser.add_argument("--limit", type=int, default=50, help="Maximal number of search results")
+    list_parser.set_defaults(handler=cmd_list)
+
+    import_parser = commands.add_parser("import", help="Import passwords from a CSV/JSON export of another password manager")
+    import_parser.add_argument("path", help="Exported file")
+    import_parser.add_argument("--format", choices=["csv", "json", "jsonl"], help="Format of the file, default is its extension")
+    import_parser.add_argument("--workers", type=int, help="Number of worker processes, default is number of CPUs")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="Rows inserted per transaction")
+    import_parser.set_defaults(handler=cmd_import)
+
+    report_parser = commands.add_parser("report", help="Print sites ordered by password age (oldest first) as JSON lines")
+    report_parser.add_argument("--older-than", type=int, metavar="DAYS", help="Print only passwords older than DAYS")
+    report_parser.add_argument("--limit", type=int, help="Maximal number of printed sites")
+    report_parser.set_defaults(handler=cmd_report)
+
+    reused_parser = commands.add_parser("reused", help="Print sites sharing the same password, one group per line")
+    reused_parser.add_argument("--backfill", action="store_true",
+                               help="Fingerprint passwords saved without fingerprint first, needs main password")
+    reused_parser.set_defaults(handler=cmd_reused)
+
+    generate_parser = commands.add_parser("generate", help="Print random passwords")
+    generate_parser.add_argument("--count", type=int, default=1, help="Number of passwords")
+    _add_generator_arguments(generate_parser)
+    generate_parser.set_defaults(handler=cmd_generate)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except Exception as ex:
+        # Expected errors are reported without a traceback, hsh is imported only if something failed
+        from .utils.hsh import WrongPasswordError
+        if not isinstance(ex, (ValueError, WrongPasswordError)):
+            raise
+        print(ex, file=sys.stderr)
+        return 1
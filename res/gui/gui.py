@@ -1,6 +1,6 @@
 import sys, pyperclip, string
 
-from ..utils import PWGenerator, DBHandler, CryptoManager, WrongPasswordError
+from ..utils import PWGenerator, DBHandler, WrongPasswordError, clear_key_cache, SiteIndex, Vault
 
 from PySide6.QtWidgets import (
     QApplication,
@@ -10,11 +10,30 @@ from PySide6.QtWidgets import (
     QDialog,
     QListWidgetItem,
 )
-from PySide6.QtCore import Qt, QThread, Signal, Slot, QStringListModel, QPointF, QPoint
+from PySide6.QtCore import (
+    Qt,
+    QThread,
+    Signal,
+    Slot,
+    QStringListModel,
+    QPointF,
+    QPoint,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    QEvent,
+    QAbstractListModel,
+    QModelIndex,
+)
 from .gui_login_ui import Ui_LoginWindow
+from .resources import load_resources
 from .gui_pwmanager_ui import Ui_PasswordGUI
 
 
+# Key derivation of a new vault is calibrated to take this time
+UNLOCK_TARGET_SECONDS = 0.25
+
+
 def PysideSysAttrSetter(fnc):
     """
     This decorator adds system enviroment, mostly wanted to test this approach
@@ -27,6 +46,160 @@ def PysideSysAttrSetter(fnc):
 
     return add_sys_variables
 
+class WorkerSignals(QObject):
+    """
+    Signals emitted by Worker
+
+    progress: str message describing current step
+    finished: return value of the executed function
+    error: exception raised by the executed function
+    """
+
+    progress = Signal(str)
+    finished = Signal(object)
+    error = Signal(object)
+
+
+class Worker(QRunnable):
+    """
+    Runs function in a QThreadPool thread, result is delivered back by signals.
+    Executed function gets "progress" kwarg - callable that emits progress signal.
+    """
+
+    def __init__(self, fnc, *args, **kwargs) -> None:
+        super().__init__()
+        self.fnc = fnc
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            result = self.fnc(*self.args, progress=self.signals.progress.emit, **self.kwargs)
+        except Exception as ex:
+            self.signals.error.emit(ex)
+        else:
+            self.signals.finished.emit(result)
+
+
+class TaskRunner:
+    """
+    Execution layer for KDF, database and crypto calls, so they do not block Qt event loop.
+    Callbacks are called in the GUI thread.
+    """
+
+    def __init__(self) -> None:
+        self._pool = QThreadPool.globalInstance()
+        # Keep references to running workers - their signals must outlive the thread
+        self._workers = set()
+
+    def run(self, fnc, *args, on_finished=None, on_error=None, on_progress=None, **kwargs) -> Worker:
+        """
+        Run fnc(*args, progress=..., **kwargs) in a worker thread
+
+        Args:
+            fnc: function to be executed
+            on_finished: called with return value of fnc
+            on_error: called with exception raised by fnc
+            on_progress: called with progress messages
+
+        Returns:
+            Worker: started worker
+        """
+        worker = Worker(fnc, *args, **kwargs)
+        if on_progress:
+            worker.signals.progress.connect(on_progress)
+        if on_finished:
+            worker.signals.finished.connect(on_finished)
+        if on_error:
+            worker.signals.error.connect(on_error)
+        worker.signals.finished.connect(lambda _: self._workers.discard(worker))
+        worker.signals.error.connect(lambda _: self._workers.discard(worker))
+        self._workers.add(worker)
+        self._pool.start(worker)
+        return worker
+
+    def wait(self) -> None:
+        """
+        Block until all workers are done
+        """
+        self._pool.waitForDone()
+
+
+def print_progress(msg: str) -> None:
+    print(msg)
+
+
+class SiteListModel(QAbstractListModel):
+    """
+    List model of sites backed by the database.
+    Sites are fetched page by page when the view asks for them (canFetchMore/fetchMore),
+    so only visible part of the vault is loaded.
+    """
+
+    def __init__(self, db_handle: DBHandler, batch_size: int = 200, parent=None) -> None:
+        super().__init__(parent)
+        self.db_handle = db_handle
+        self.batch_size = batch_size
+        self._entries = []
+        self._all_fetched = False
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._entries):
+            return None
+        entry = self._entries[index.row()]
+        if role == Qt.DisplayRole:
+            return entry.site
+        if role == Qt.UserRole:
+            return entry
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+        return not self._all_fetched
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        """
+        Loads next page of sites and appends it to the model
+        """
+        if parent.isValid():
+            return
+        after_id = self._entries[-1].id if self._entries else None
+        page = self.db_handle.get_sites(limit=self.batch_size, after_id=after_id)
+        if len(page) < self.batch_size:
+            self._all_fetched = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._entries), len(self._entries) + len(page) - 1)
+        self._entries.extend(page)
+        self.endInsertRows()
+
+    def fetch_new(self) -> None:
+        """
+        Appends sites saved after the last fetch - new sites have the highest ids.
+        If not all sites were fetched yet, new sites are loaded together with the remaining pages.
+        """
+        if self._all_fetched:
+            self._all_fetched = False
+            self.fetchMore()
+
+    def refresh(self) -> None:
+        """
+        Drops loaded sites, the view fetches the first page again
+        """
+        self.beginResetModel()
+        self._entries = []
+        self._all_fetched = False
+        self.endResetModel()
+
+
 class PasswordIsMissing(Exception):
     def __init__(self, msg: str, *args: object) -> None:
         super().__init__(*args)
@@ -94,9 +267,14 @@ class LoginWindow(QWidget, Ui_LoginWindow):
             parrent: some kind of controller object
         """
         super().__init__()
+        # Logo and icons are registered just before the first window is built
+        load_resources()
         self.setupUi(self)
         self.setWindowFlags(self.windowFlags() | Qt.FramelessWindowHint)
         self.parrent = parrent
+        self.db_handle = DBHandler()
+        self.task_runner = TaskRunner()
+        self._is_busy = False
         self._add_events()
         
         self.SetPasswordText.setVisible(False)
@@ -124,17 +302,45 @@ class LoginWindow(QWidget, Ui_LoginWindow):
             self.mouseMovePos = event.globalPosition()
 
     def try_to_log_in(self):
-        try:
-            if self._is_pw_valid_password(self.PasswordEdit.text()):
-                self.parrent.login_successful(self.PasswordEdit.text())
-            else:
-                print("Login was not successful - wrong password")
-        except PasswordIsMissing as ex:
-            print(ex.msg)
-            print("Setup password than try it again")
+        if self._is_busy:
+            return
+        self._set_busy(True)
+        password = self.PasswordEdit.text()
+        # Key derivation is slow - run it outside of the GUI thread
+        self.task_runner.run(
+            self._is_pw_valid_password,
+            password,
+            on_finished=lambda is_valid: self._log_in_checked(password, is_valid),
+            on_error=self._log_in_failed,
+            on_progress=print_progress,
+        )
+
+    def _log_in_checked(self, password: str, is_valid: bool):
+        self._set_busy(False)
+        if is_valid:
+            self.parrent.login_successful(password)
+        else:
+            print("Login was not successful - wrong password")
+
+    def _log_in_failed(self, ex: Exception):
+        self._set_busy(False)
+        if not isinstance(ex, PasswordIsMissing):
+            raise ex
+        # If there is no main password - > ask user to create one
+        self._set_create_password_mode()
+        print(ex.msg)
+        print("Setup password than try it again")
+
+    def _set_busy(self, is_busy: bool):
+        """
+        Disable inputs while a worker is running
+        """
+        self._is_busy = is_busy
+        self.LoginButton.setEnabled(not is_busy)
+        self.PasswordEdit.setEnabled(not is_busy)
 
     def eventFilter(self, obj, event):
-        if obj is self.PasswordEdit and event.type() == event.KeyPress:
+        if obj is self.PasswordEdit and event.type() == QEvent.KeyPress:
             # Check if the pressed key is the Enter key
             if event.key() == Qt.Key_Enter or event.key() == Qt.Key_Return:
                 # Call the login method when the Enter key is pressed
@@ -145,65 +351,42 @@ class LoginWindow(QWidget, Ui_LoginWindow):
                 return True  # Event handled
         return False  # Event not handled
 
-    def _is_pw_valid_password(self, password: str) -> bool:
+    def _is_pw_valid_password(self, password: str, progress=print_progress) -> bool:
         """
         Returns True if password is the main password
+        It does not touch widgets - it is executed in a worker thread
 
-        1) Find hsh password in DB
-        2) Try password: str as a key
-        3) If it passes -> you have right pass
+        Raises:
+            PasswordIsMissing: If there is no main password yet
 
         Returns:
             bool: True if password is correct
         """
-        # Get the main password
-        try:
-            pw_binary = self._find_main_password()
-        except PasswordIsMissing as ex:
-            # If there is no main password - > ask user to create one
-            self._set_create_password_mode()
+        progress("Looking for main password")
+        vault = Vault(self.db_handle)
+        if not vault.exists():
             raise PasswordIsMissing("Password creation is required")
 
-        hsh_handle = CryptoManager(password)
-        try:
-            hsh_handle.decrypt_string(pw_binary)
-            return True
-        except WrongPasswordError:
-            return False
-
-    def _find_main_password(self) -> bytes:
-        """
-        Returns a main password if exists, otherwise PasswordIsMissing is thowrn
-        
-        Raises:
-            ValueError: _description_
-
-        Returns:
-            bytes: password in bytes if exist
-        """
-        db_password = DBHandler()
-        try:
-            pw_binary = db_password.get_password("MAINPW")
-            return pw_binary
-        except ValueError as ex:
-            raise PasswordIsMissing("MainPassword was not found - add new one")
+        progress("Deriving key")
+        return vault.verify(password)
 
     def _set_new_main_pw(self) -> None:
+        if self._is_busy:
+            return
         new_password = self.PasswordEdit.text()
         try:
             self._password_is_valid(new_password)
-            
+
             # Save encrypted password if it is ok
-            db_handle = DBHandler()
-            hsh_handle = CryptoManager(new_password)
-            pw_bytes = hsh_handle.encrypt_string(new_password)
-            db_handle.save_password("MAINPW", pw_bytes)
-            
-            # Changes mode to login
-            self._set_login_mode()
-            # Remove password - force user to write it again
-            self.PasswordEdit.setText("")
-            
+            self._set_busy(True)
+            self.task_runner.run(
+                self._save_main_password,
+                new_password,
+                on_finished=self._new_main_pw_saved,
+                on_error=self._new_main_pw_failed,
+                on_progress=print_progress,
+            )
+
         except PasswordToShortError as ex:
             print(ex)
             self.SetPasswordText.text = ex.msg
@@ -214,6 +397,24 @@ class LoginWindow(QWidget, Ui_LoginWindow):
             print(ex)
             self.SetPasswordText.text = ex.msg
 
+    def _save_main_password(self, new_password: str, progress=print_progress) -> None:
+        """
+        Creates vault - saves MAINPW and data key encrypted by the password - executed in a worker thread
+        """
+        progress("Calibrating key derivation")
+        Vault(self.db_handle).create(new_password, target_seconds=UNLOCK_TARGET_SECONDS)
+
+    def _new_main_pw_saved(self, _) -> None:
+        self._set_busy(False)
+        # Changes mode to login
+        self._set_login_mode()
+        # Remove password - force user to write it again
+        self.PasswordEdit.setText("")
+
+    def _new_main_pw_failed(self, ex: Exception) -> None:
+        self._set_busy(False)
+        raise ex
+
     def _password_is_valid(self, password: str) -> bool:
         """Check if password meet all critteria, returns True
         otherwise one of exception is rissen
@@ -279,17 +480,20 @@ class PWManagerWindow(QWidget, Ui_PasswordGUI):
         # Settup GUI
         self.setupUi(self)
 
-        # Connect events to insturments
-        self._add_events()
-
         # Set up database communication
         self.db_handle = DBHandler()
 
+        # Connect events to insturments
+        self._add_events()
+
         # Set up random password generator
         self.pw_gen = PWGenerator(12)
 
-        # Set up crypto manager
-        self.hsh_handle = CryptoManager(password)
+        # Set up crypto manager of the data key - key derived during login is taken from the key cache
+        self.hsh_handle = Vault(self.db_handle).unlock(password)
+
+        # Database and crypto calls are executed in worker threads
+        self.task_runner = TaskRunner()
 
     def add_site_button_clicked(self) -> None:
         """
@@ -301,27 +505,72 @@ class PWManagerWindow(QWidget, Ui_PasswordGUI):
             password = self.pw_gen.get_random_password()
         else:
             password = self.PasswordEdit.text()
-            
+
+        # Step 2 and 3 are executed in a worker thread
+        self.AddSiteButton.setEnabled(False)
+        self.task_runner.run(
+            self._save_site,
+            site,
+            password,
+            on_finished=self._site_saved,
+            on_error=self._site_not_saved,
+            on_progress=print_progress,
+        )
+
+    def _save_site(self, site: str, password: str, progress=print_progress) -> None:
         # Step 2 encrypt password using main password
+        progress("Encrypting password")
         random_password_bytes = self.hsh_handle.encrypt_string(password)
-        
+
         # Step 3 save site + password
-        self.db_handle.save_password(site, random_password_bytes)
-        self._display_sites()
+        progress("Saving password")
+        self.db_handle.save_password(site, random_password_bytes, fingerprint=self.hsh_handle.fingerprint(password))
+
+    def _site_saved(self, _) -> None:
+        self.AddSiteButton.setEnabled(True)
+        # Only the new site is loaded, already displayed sites are kept
+        self.list_model.fetch_new()
+        if self.SearchEdit.text():
+            self._search_changed(self.SearchEdit.text())
+
+    def _site_not_saved(self, ex: Exception) -> None:
+        self.AddSiteButton.setEnabled(True)
+        if not isinstance(ex, ValueError):
+            raise ex
+        # E.g. reserved site name, rejected by DBHandler
+        print(ex)
 
     def get_password_check_box_clicked(self):
         print("Coping password")
         site = self.PasswordView.currentIndex().data()
+        self.GetPasswordButton.setEnabled(False)
+        self.task_runner.run(
+            self._load_password,
+            site,
+            on_finished=self._password_loaded,
+            on_error=self._password_not_loaded,
+            on_progress=print_progress,
+        )
+
+    def _load_password(self, site: str, progress=print_progress) -> str:
+        progress("Loading password")
         password_bytes = self.db_handle.get_password(site)
-        try:
-            password_string = self.hsh_handle.decrypt_string(password_bytes)
-        except WrongPasswordError as ex:
-            print("MainPW was not able to decrypt selected sites PW")
-            print(ex.msg)
-            return None
+        progress("Decrypting password")
+        return self.hsh_handle.decrypt_string(password_bytes)
+
+    def _password_loaded(self, password_string: str) -> None:
+        self.GetPasswordButton.setEnabled(True)
+        # Clipboard has to be accessed from GUI thread
         pyperclip.copy(password_string)
         print("Password copied!")
 
+    def _password_not_loaded(self, ex: Exception) -> None:
+        self.GetPasswordButton.setEnabled(True)
+        if not isinstance(ex, WrongPasswordError):
+            raise ex
+        print("MainPW was not able to decrypt selected sites PW")
+        print(ex.msg)
+
     def _get_new_site_name(self) -> str:
         return self.SiteEdit.text()
 
@@ -335,21 +584,63 @@ class PWManagerWindow(QWidget, Ui_PasswordGUI):
         self.generatePasswordCHB.clicked.connect(self._generate_pw_clicked)
 
         # Create a ListModel for handling displaying passwords
-        self.list_model = QStringListModel()
+        # Sites are loaded lazily as the QListView scrolls
+        self.list_model = SiteListModel(self.db_handle)
+        self.PasswordView.setModel(self.list_model)
 
         # Fill QListView instrument with sites
         self._display_sites()
-    
+
+        # Search above the sites list, index is built in a worker thread on the first search
+        # and then updated on every save
+        self.site_index = None
+        self._site_index_loading = False
+        self.search_model = QStringListModel()
+        self.SearchEdit.textChanged.connect(self._search_changed)
+
+    def _search_changed(self, text: str):
+        """
+        Show ranked search results, or all sites if search is empty
+        """
+        if not text:
+            self.PasswordView.setModel(self.list_model)
+            return
+        if self.site_index is None:
+            # Results are shown when the index is built
+            self._load_site_index()
+            return
+        self.search_model.setStringList(self.site_index.search(text, limit=200))
+        self.PasswordView.setModel(self.search_model)
+
+    def _load_site_index(self) -> None:
+        if self._site_index_loading:
+            return
+        self._site_index_loading = True
+        self.task_runner.run(
+            self._build_site_index,
+            on_finished=self._site_index_loaded,
+            on_error=self._site_index_not_loaded,
+            on_progress=print_progress,
+        )
+
+    def _build_site_index(self, progress=print_progress) -> SiteIndex:
+        progress("Indexing sites")
+        return SiteIndex().attach(self.db_handle)
+
+    def _site_index_loaded(self, site_index: SiteIndex) -> None:
+        self._site_index_loading = False
+        self.site_index = site_index
+        self._search_changed(self.SearchEdit.text())
+
+    def _site_index_not_loaded(self, ex: Exception) -> None:
+        self._site_index_loading = False
+        raise ex
+
     def _display_sites(self):
         """
         Refresh sites list
         """
-        # Get sites from database
-        db_handle = DBHandler()
-        self.list_model.setStringList(db_handle.get_all_sites())
-
-        # Update QListView instrument
-        self.PasswordView.setModel(self.list_model)
+        self.list_model.refresh()
 
 
 class MainGuiHandler(QMainWindow):
@@ -364,6 +655,8 @@ class MainGuiHandler(QMainWindow):
     @PysideSysAttrSetter
     def __init__(self) -> None:
         self.app = QApplication(sys.argv)
+        # Create database engine and schema once at startup, windows share it
+        DBHandler()
         self.login_window = LoginWindow(self)
         self.login_window.show()
 
@@ -393,6 +686,8 @@ class MainGuiHandler(QMainWindow):
         self.pw_manager_window.show()
     
     def close_application(self):
+        # Forget derived keys before exit
+        clear_key_cache()
         sys.exit()
         
 
@@ -3,7 +3,7 @@
 ################################################################################
 ## Form generated from reading UI file 'gui_pwmanager.ui'
 ##
-## Created by: Qt User Interface Compiler version 6.3.2
+## Created by: Qt User Interface Compiler version 6.12.0
 ##
 ## WARNING! All changes made in this file will be lost when recompiling UI file!
 ################################################################################
@@ -27,6 +27,9 @@ class Ui_PasswordGUI(object):
         self.PasswordView = QListView(PasswordGUI)
         self.PasswordView.setObjectName(u"PasswordView")
         self.PasswordView.setGeometry(QRect(10, 40, 256, 411))
+        self.SearchEdit = QLineEdit(PasswordGUI)
+        self.SearchEdit.setObjectName(u"SearchEdit")
+        self.SearchEdit.setGeometry(QRect(10, 10, 256, 24))
         self.formLayoutWidget = QWidget(PasswordGUI)
         self.formLayoutWidget.setObjectName(u"formLayoutWidget")
         self.formLayoutWidget.setGeometry(QRect(290, 40, 291, 411))
@@ -41,44 +44,44 @@ class Ui_PasswordGUI(object):
         self.label.setObjectName(u"label")
         self.label.setMinimumSize(QSize(60, 0))
 
-        self.formLayout.setWidget(0, QFormLayout.LabelRole, self.label)
+        self.formLayout.setWidget(0, QFormLayout.ItemRole.LabelRole, self.label)
 
         self.SiteEdit = QLineEdit(self.formLayoutWidget)
         self.SiteEdit.setObjectName(u"SiteEdit")
 
-        self.formLayout.setWidget(0, QFormLayout.FieldRole, self.SiteEdit)
+        self.formLayout.setWidget(0, QFormLayout.ItemRole.FieldRole, self.SiteEdit)
 
         self.generatePasswordCHB = QCheckBox(self.formLayoutWidget)
         self.generatePasswordCHB.setObjectName(u"generatePasswordCHB")
 
-        self.formLayout.setWidget(1, QFormLayout.SpanningRole, self.generatePasswordCHB)
+        self.formLayout.setWidget(1, QFormLayout.ItemRole.SpanningRole, self.generatePasswordCHB)
 
         self.AddSiteButton = QPushButton(self.formLayoutWidget)
         self.AddSiteButton.setObjectName(u"AddSiteButton")
         self.AddSiteButton.setMinimumSize(QSize(0, 50))
 
-        self.formLayout.setWidget(3, QFormLayout.SpanningRole, self.AddSiteButton)
+        self.formLayout.setWidget(3, QFormLayout.ItemRole.SpanningRole, self.AddSiteButton)
 
         self.GetPasswordButton = QPushButton(self.formLayoutWidget)
         self.GetPasswordButton.setObjectName(u"GetPasswordButton")
         self.GetPasswordButton.setMinimumSize(QSize(0, 50))
 
-        self.formLayout.setWidget(5, QFormLayout.SpanningRole, self.GetPasswordButton)
+        self.formLayout.setWidget(5, QFormLayout.ItemRole.SpanningRole, self.GetPasswordButton)
 
-        self.verticalSpacer = QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding)
+        self.verticalSpacer = QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
 
-        self.formLayout.setItem(4, QFormLayout.SpanningRole, self.verticalSpacer)
+        self.formLayout.setItem(4, QFormLayout.ItemRole.SpanningRole, self.verticalSpacer)
 
         self.PasswordEdit = QLineEdit(self.formLayoutWidget)
         self.PasswordEdit.setObjectName(u"PasswordEdit")
 
-        self.formLayout.setWidget(2, QFormLayout.FieldRole, self.PasswordEdit)
+        self.formLayout.setWidget(2, QFormLayout.ItemRole.FieldRole, self.PasswordEdit)
 
         self.label_2 = QLabel(self.formLayoutWidget)
         self.label_2.setObjectName(u"label_2")
         self.label_2.setMinimumSize(QSize(60, 0))
 
-        self.formLayout.setWidget(2, QFormLayout.LabelRole, self.label_2)
+        self.formLayout.setWidget(2, QFormLayout.ItemRole.LabelRole, self.label_2)
 
         QWidget.setTabOrder(self.PasswordView, self.SiteEdit)
         QWidget.setTabOrder(self.SiteEdit, self.generatePasswordCHB)
@@ -93,6 +96,7 @@ class Ui_PasswordGUI(object):
 
     def retranslateUi(self, PasswordGUI):
         PasswordGUI.setWindowTitle(QCoreApplication.translate("PasswordGUI", u"Form", None))
+        self.SearchEdit.setPlaceholderText(QCoreApplication.translate("PasswordGUI", u"Search", None))
         self.label.setText(QCoreApplication.translate("PasswordGUI", u"Site:", None))
         self.generatePasswordCHB.setText(QCoreApplication.translate("PasswordGUI", u"Generate random password", None))
         self.AddSiteButton.setText(QCoreApplication.translate("PasswordGUI", u"Add", None))
@@ -0,0 +1,80 @@
+"""
+Qt resources of the GUI (:/logo/logo.png, :/Button/xbutton.png).
+
+Resources are registered from the binary logo.rcc file - Qt memory-maps it, nothing is parsed by Python.
+Compiled module logo_rc.py (~1 MB of Python source) is imported only as a fallback,
+or if PWMANAGER_QT_RESOURCES=module is set.
+*.ui files do not include logo.qrc, so generated *_ui.py files do not import logo_rc -
+resources are registered by load_resources before setupUi is called.
+
+Regenerate UI files and resources (from res/gui):
+    pyside6-uic gui_login.ui -o gui_login_ui.py
+    pyside6-uic gui_pwmanager.ui -o gui_pwmanager_ui.py
+    pyside6-rcc logo.qrc -o logo_rc.py
+    python -m res.gui.resources
+"""
+from typing import Optional
+import os, struct
+
+RCC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.rcc")
+# Version of the rcc format of logo_rc.py (first argument of qRegisterResourceData)
+RCC_FORMAT_VERSION = 3
+
+# Mode used to register resources, None until load_resources is called
+_mode: Optional[str] = None
+
+
+def load_resources(mode: Optional[str] = None) -> str:
+    """
+    Register Qt resources once, next calls do nothing
+
+    (Optional)
+        mode (str): "rcc" or "module". Defaults to PWMANAGER_QT_RESOURCES environment variable,
+            or "rcc" if logo.rcc exists.
+
+    Raises:
+        ValueError: If mode is unknown
+
+    Returns:
+        str: Mode used to register resources
+    """
+    global _mode
+    if _mode is not None:
+        return _mode
+    mode = mode or os.environ.get("PWMANAGER_QT_RESOURCES") or ("rcc" if os.path.exists(RCC_PATH) else "module")
+    if mode == "rcc":
+        from PySide6.QtCore import QResource
+        if not QResource.registerResource(RCC_PATH):
+            raise ValueError(f"Unable to register Qt resources from {RCC_PATH}")
+    elif mode == "module":
+        from . import logo_rc
+    else:
+        raise ValueError(f"Unknown Qt resources mode {mode}")
+    _mode = mode
+    return _mode
+
+
+def build_rcc(path: str = RCC_PATH) -> int:
+    """
+    Write resources compiled in logo_rc.py to a binary .rcc file (same output as pyside6-rcc --binary)
+
+    Returns:
+        int: Size of the file
+    """
+    from . import logo_rc
+
+    # Header: magic, version, offsets of tree, data and names, flags. Data, names and tree follow.
+    header_size = 4 + 5 * 4
+    data_offset = header_size
+    names_offset = data_offset + len(logo_rc.qt_resource_data)
+    tree_offset = names_offset + len(logo_rc.qt_resource_name)
+    with open(path, "wb") as file:
+        file.write(b"qres" + struct.pack(">IIIII", RCC_FORMAT_VERSION, tree_offset, data_offset, names_offset, 0))
+        file.write(logo_rc.qt_resource_data)
+        file.write(logo_rc.qt_resource_name)
+        file.write(logo_rc.qt_resource_struct)
+        return file.tell()
+
+
+if __name__ == '__main__':
+    print(f"{RCC_PATH}: {build_rcc()} bytes")
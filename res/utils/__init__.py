@@ -1,3 +1,40 @@
-from .db import DBHandler
-from .hsh import CryptoManager, WrongPasswordError
-from .pwgen import PWGenerator
\ No newline at end of file
+from importlib import import_module
+
+# Public name -> module, modules are imported on the first access so scripts import only what they use
+_EXPORTS = {
+    "DBHandler": ".db",
+    "engine_registry": ".db",
+    "SQLITE_PROFILES": ".db",
+    "CryptoManager": ".hsh",
+    "WrongPasswordError": ".hsh",
+    "clear_key_cache": ".hsh",
+    "KDFParams": ".hsh",
+    "calibrate_iterations": ".hsh",
+    "KDF_PRESETS": ".hsh",
+    "available_presets": ".hsh",
+    "PWGenerator": ".pwgen",
+    "SiteIndex": ".search",
+    "rekey_vault": ".rekey",
+    "Vault": ".vault",
+    "export_vault": ".archive",
+    "import_vault": ".archive",
+    "import_entries": ".importer",
+    "parse_file": ".importer",
+    "iter_age_report": ".report",
+    "write_ndjson": ".report",
+    "backfill_fingerprints": ".fingerprint",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
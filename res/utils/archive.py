@@ -0,0 +1,197 @@
+from hashlib import sha256
+from itertools import chain, islice
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+import json, os, struct, time
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .db import DBHandler
+from .hsh import CryptoManager, KDFParams, WrongPasswordError
+
+# Archive layout:
+#   MAGIC | header length (4 bytes) | header JSON (KDF parameters and verifier of the archive password)
+#   chunks: length (4 bytes) | last chunk flag (1 byte) | nonce (12 bytes) |
+#           AES-GCM ciphertext of JSON list of [site, date, password]
+# Associated data of every chunk is hash of the header, chunk index and last chunk flag,
+# so chunks can not be modified, reordered, dropped or moved to another archive.
+MAGIC = b"PWMARC\x00\x01"
+# Lengths are read before anything is authenticated, larger lengths are refused instead of allocated
+MAX_HEADER_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+_LENGTH = struct.Struct(">I")
+_CHUNK_HEADER = struct.Struct(">I?")
+_CHUNK_AAD = struct.Struct(">Q?")
+
+
+class ArchiveStats(NamedTuple):
+    """
+    Result of export_vault and import_vault
+    """
+    rows: int
+    bytes: int
+    seconds: float
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / self.seconds / 1_000_000 if self.seconds else 0.0
+
+
+def _archive_cipher(crypto: CryptoManager) -> AESGCM:
+    return AESGCM(crypto.derive_subkey(b"archive"))
+
+
+def _chunk_aad(header_hash: bytes, index: int, last: bool) -> bytes:
+    return header_hash + _CHUNK_AAD.pack(index, last)
+
+
+def _check_length(length: int, limit: int) -> int:
+    if length > limit:
+        raise ValueError("Archive is corrupted, length is over the limit")
+    return length
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Archive is truncated")
+    return data
+
+
+def export_vault(db_handle: DBHandler, data_crypto: CryptoManager, path: str, archive_password: str,
+                 chunk_rows: int = 1000, kdf_params: Optional[KDFParams] = None) -> ArchiveStats:
+    """
+    Export all passwords of the vault including the history to an encrypted archive file.
+    Passwords are decrypted by the data key and encrypted by a key derived from archive_password,
+    so the archive can be imported into any vault. Rows are streamed, memory does not grow with the vault size.
+    History rows are written before current passwords, so import saves them in the original order.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+        data_crypto (CryptoManager): CryptoManager of the data key, returned by Vault.unlock
+        path (str): Archive file, it is overwritten
+        archive_password (str): Password of the archive
+    (Optional)
+        chunk_rows (int): Number of rows in one encrypted chunk
+        kdf_params (KDFParams): Key derivation of the archive password. Defaults to new KDFParams.
+
+    Returns:
+        ArchiveStats: Number of rows, archive size and duration
+    """
+    if chunk_rows < 1:
+        raise ValueError("Chunk must have at least 1 row")
+    start = time.perf_counter()
+    kdf_params = kdf_params or KDFParams.generate()
+    archive_crypto = kdf_params.create_crypto(archive_password)
+    cipher = _archive_cipher(archive_crypto)
+    # Only the archive sub-key is used, derived key is not kept in the key cache
+    archive_crypto.lock(archive_password)
+    header = json.dumps({"kdf": kdf_params.to_dict(), "verifier": archive_crypto.verifier().hex()}).encode()
+    header_hash = sha256(MAGIC + header).digest()
+
+    rows = chain(db_handle.iter_history_rows(batch_size=chunk_rows, include_reserved=False),
+                 db_handle.iter_rows(batch_size=chunk_rows, include_reserved=False))
+    chunks = iter(lambda: list(islice(rows, chunk_rows)), [])
+    count = 0
+    with open(path, "wb") as file:
+        file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        # One chunk is read ahead to know which chunk is the last one
+        chunk = next(chunks, [])
+        index = 0
+        while True:
+            next_chunk = next(chunks, None)
+            passwords = data_crypto.decrypt_many(row.pw for row in chunk)
+            plain = json.dumps([[row.site, row.date, password] for row, password in zip(chunk, passwords)]).encode()
+            last = next_chunk is None
+            nonce = os.urandom(12)
+            encrypted = cipher.encrypt(nonce, plain, _chunk_aad(header_hash, index, last))
+            if len(nonce) + len(encrypted) > MAX_CHUNK_SIZE:
+                raise ValueError("Chunk is larger than MAX_CHUNK_SIZE, use fewer chunk_rows")
+            file.write(_CHUNK_HEADER.pack(len(nonce) + len(encrypted), last) + nonce + encrypted)
+            count += len(chunk)
+            if last:
+                break
+            chunk = next_chunk
+            index += 1
+        size = file.tell()
+    return ArchiveStats(count, size, time.perf_counter() - start)
+
+
+def read_archive(path: str, archive_password: str) -> Iterator[List[Tuple[str, str, str]]]:
+    """
+    Decrypt archive chunk by chunk
+
+    Args:
+        path (str): Archive file
+        archive_password (str): Password of the archive
+
+    Raises:
+        WrongPasswordError: If archive_password is not the password of the archive
+        ValueError: If archive is not an archive, is truncated, was modified or has a length over the limit
+
+    Yields:
+        List[Tuple[str, str, str]]: (site, date, password) rows of one chunk
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("File is not a password archive")
+        header_length = _LENGTH.unpack(_read_exactly(file, _LENGTH.size))[0]
+        header = _read_exactly(file, _check_length(header_length, MAX_HEADER_SIZE))
+        values = json.loads(header)
+        archive_crypto = KDFParams.from_dict(values["kdf"]).create_crypto(archive_password)
+        archive_crypto.lock(archive_password)
+        if not archive_crypto.verify(bytes.fromhex(values["verifier"])):
+            raise WrongPasswordError("Wrong archive password")
+        cipher = _archive_cipher(archive_crypto)
+        header_hash = sha256(MAGIC + header).digest()
+
+        index = 0
+        while True:
+            length, last = _CHUNK_HEADER.unpack(_read_exactly(file, _CHUNK_HEADER.size))
+            record = _read_exactly(file, _check_length(length, MAX_CHUNK_SIZE))
+            try:
+                plain = cipher.decrypt(record[:12], record[12:], _chunk_aad(header_hash, index, last))
+            except InvalidTag:
+                raise ValueError("Archive was modified")
+            yield [tuple(row) for row in json.loads(plain)]
+            if last:
+                if file.read(1):
+                    raise ValueError("Archive has data after the last chunk")
+                return
+            index += 1
+
+
+def import_vault(db_handle: DBHandler, data_crypto: CryptoManager, path: str, archive_password: str,
+                 batch_size: int = 1000) -> ArchiveStats:
+    """
+    Import passwords from an archive made by export_vault. Passwords are encrypted by the data key of the vault
+    and saved by DBHandler.save_passwords chunk by chunk, memory does not grow with the archive size.
+    Sites already in the vault get the imported password as the current one, their password goes to the history.
+    Rows of a corrupted archive that were read before the corrupted chunk stay saved.
+    Archive with a row of RESERVED_SITES (MAINPW, MAINKEY) is refused by DBHandler.save_passwords.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+        data_crypto (CryptoManager): CryptoManager of the data key, returned by Vault.unlock
+        path (str): Archive file
+        archive_password (str): Password of the archive
+    (Optional)
+        batch_size (int): Number of rows inserted per transaction
+
+    Raises:
+        WrongPasswordError: If archive_password is not the password of the archive
+        ValueError: If archive is not an archive, is truncated, was modified or has a reserved site
+
+    Returns:
+        ArchiveStats: Number of rows, archive size and duration
+    """
+    start = time.perf_counter()
+
+    def rows():
+        for chunk in read_archive(path, archive_password):
+            passwords = data_crypto.encrypt_many(password for _, _, password in chunk)
+            yield from ((site, password, date, data_crypto.fingerprint(plain))
+                        for (site, date, plain), password in zip(chunk, passwords))
+
+    count = db_handle.save_passwords(rows(), batch_size=batch_size)
+    return ArchiveStats(count, os.path.getsize(path), time.perf_counter() - start)
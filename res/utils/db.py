@@ -1,21 +1,274 @@
-from sqlalchemy import create_engine, Column, Integer, String, Table, MetaData, LargeBinary
+from sqlalchemy import create_engine, event, func, insert, inspect, select, text, tuple_, update, Column, Index, Integer, String, Table, MetaData, LargeBinary
 from sqlalchemy.orm import declarative_base, Session
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from itertools import groupby, islice
+import threading, time
 from datetime import datetime
 
 Base = declarative_base()
 
+DEFAULT_DATABASE_URL = 'sqlite:///main.db'
+
+# SQLite PRAGMAs executed on every new connection, profile name -> {pragma: value}
+# journal_mode=WAL is saved in the database file, so it stays on even for connections of other profiles
+SQLITE_PROFILES: Dict[str, Dict[str, object]] = {
+    # SQLite defaults - rollback journal, every commit is synced
+    "default": {},
+    # Readers are not blocked by a writer, every commit is synced - a saved password survives power loss
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "temp_store": "MEMORY",
+        "cache_size": -16000,  # KiB
+        "mmap_size": 64 * 1024 * 1024,
+    },
+    # Opt-in for bulk jobs, commit is synced only at WAL checkpoints.
+    # Committed data survive application crash, last commits can be lost on power loss.
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -16000,  # KiB
+        "mmap_size": 64 * 1024 * 1024,
+    },
+}
+# Passwords are often set on a website right after they are saved, so losing a commit is not acceptable
+DEFAULT_PROFILE = "durable"
+
+# Main password encrypted by itself and data key encrypted by the main password
+MAIN_PASSWORD_SITE = "MAINPW"
+DATA_KEY_SITE = "MAINKEY"
+# Sites used internally by the application, they are not listed as user sites
+RESERVED_SITES = (MAIN_PASSWORD_SITE, DATA_KEY_SITE)
+
+# Format of the human readable date column, local time
+DATE_FORMAT = "%d.%m.%Y-%H:%M:%S"
+
 def current_date_time() -> str:
     now = datetime.now()
-    formatted_date_time = now.strftime("%d.%m.%Y-%H:%M:%S")
+    formatted_date_time = now.strftime(DATE_FORMAT)
     return formatted_date_time
 
+def date_to_timestamp(date: str) -> int:
+    """
+    Returns epoch seconds of a date in DATE_FORMAT (local time)
+
+    Raises:
+        ValueError: If date is not in DATE_FORMAT
+    """
+    return int(datetime.strptime(date, DATE_FORMAT).timestamp())
+
+def _current_timestamp() -> int:
+    return int(time.time())
+
 class Password(Base):
     __table__ = Table('pwdata', Base.metadata,
                       Column('id', Integer, primary_key=True),
                       Column('site', String),
                       Column('date', String),
-                      Column('pw', LargeBinary))
+                      Column('pw', LargeBinary),
+                      # Time of the save in epoch seconds, date is the same time formatted for people
+                      Column('timestamp', Integer, default=_current_timestamp),
+                      # HMAC of the password under a sub-key of the data key (CryptoManager.fingerprint),
+                      # equal passwords have equal fingerprints. NULL if not computed yet.
+                      Column('fingerprint', LargeBinary),
+                      # One current password per site, older passwords are in pwhistory
+                      Index('ux_pwdata_site', 'site', unique=True),
+                      # Range queries by time, rows of one timestamp are ordered by id (rowid is part of the index)
+                      Index('ix_pwdata_timestamp', 'timestamp'),
+                      # Reused passwords are found by grouping the index
+                      Index('ix_pwdata_fingerprint', 'fingerprint'))
+
+class PasswordHistory(Base):
+    """
+    Previous passwords of sites - current row of pwdata is moved here when the site is saved again
+    """
+    __table__ = Table('pwhistory', Base.metadata,
+                      Column('id', Integer, primary_key=True),
+                      Column('site', String),
+                      Column('date', String),
+                      Column('pw', LargeBinary),
+                      Column('timestamp', Integer, default=_current_timestamp),
+                      Column('fingerprint', LargeBinary),
+                      Index('ix_pwhistory_site_id', 'site', 'id'))
+
+class VaultMeta(Base):
+    """
+    Key - value metadata of the vault (e.g. parameters of the key derivation)
+    """
+    __table__ = Table('vault_meta', Base.metadata,
+                      Column('key', String, primary_key=True),
+                      Column('value', String))
+
+class RekeyState(Base):
+    """
+    Progress of unfinished re-key of the vault, there is at most one row
+    """
+    __table__ = Table('rekey_state', Base.metadata,
+                      Column('id', Integer, primary_key=True),
+                      Column('last_id', Integer),
+                      Column('history_last_id', Integer),
+                      Column('new_main_pw', LargeBinary),
+                      Column('new_data_key', LargeBinary),
+                      # KDFParams of the new main password as JSON
+                      Column('new_kdf', String, nullable=False))
+
+class SiteEntry(NamedTuple):
+    """
+    Row of pwdata without the encrypted password
+    """
+    id: int
+    site: str
+    date: str
+    timestamp: Optional[int] = None
+
+
+class PasswordRow(NamedTuple):
+    """
+    Row of pwdata
+    """
+    id: int
+    site: str
+    date: str
+    pw: bytes
+    timestamp: Optional[int] = None
+
+
+class EngineStats:
+    """
+    Counters of one engine - how many times it was created and how many connections were checked out
+    """
+
+    def __init__(self) -> None:
+        self.engine_creations = 0
+        self.checkouts = 0
+
+    def __repr__(self) -> str:
+        return f"EngineStats(engine_creations={self.engine_creations}, checkouts={self.checkouts})"
+
+
+class EngineRegistry:
+    """
+    Process wide registry of engines keyed by database URL and SQLite profile.
+    Engine (and its connection pool) is created and schema is migrated only on the first request of the URL.
+    """
+
+    def __init__(self) -> None:
+        self._engines = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get_engine(self, database_url: str, profile: str = DEFAULT_PROFILE):
+        """
+        Returns engine for database_url, it is created on the first call
+
+        Args:
+            database_url (str): The URL of the database
+        (Optional)
+            profile (str): Name of SQLITE_PROFILES applied to connections of SQLite databases
+
+        Raises:
+            ValueError: If profile is unknown
+        """
+        if profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile {profile}")
+        key = (database_url, profile)
+        with self._lock:
+            if key not in self._engines:
+                stats = self._stats.setdefault(key, EngineStats())
+                engine = create_engine(database_url)
+                if engine.dialect.name == "sqlite" and SQLITE_PROFILES[profile]:
+                    event.listen(engine, "connect", lambda connection, _: _apply_pragmas(connection, profile))
+                event.listen(engine, "checkout", lambda *args: self._count_checkout(stats))
+                Base.metadata.create_all(bind=engine)
+                _migrate(engine)
+                stats.engine_creations += 1
+                self._engines[key] = engine
+            return self._engines[key]
+
+    def stats(self, database_url: str, profile: str = DEFAULT_PROFILE) -> EngineStats:
+        """
+        Returns counters of engine for database_url and profile
+        """
+        return self._stats.setdefault((database_url, profile), EngineStats())
+
+    def dispose(self, database_url: Optional[str] = None) -> None:
+        """
+        Close pooled connections and forget engines of database_url (all profiles), all engines if None is passed
+        """
+        with self._lock:
+            keys = [key for key in self._engines if database_url is None or key[0] == database_url]
+            for key in keys:
+                self._engines.pop(key).dispose()
+
+    @staticmethod
+    def _count_checkout(stats: EngineStats) -> None:
+        stats.checkouts += 1
+
+
+def _apply_pragmas(dbapi_connection, profile: str) -> None:
+    """
+    Execute PRAGMAs of the profile on a new DB-API connection
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PROFILES[profile].items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+engine_registry = EngineRegistry()
+
+
+# Indexes of older schemas that are not used any more, e.g. (site, date) is covered by unique ux_pwdata_site
+DROPPED_INDEXES = ("ix_pwdata_site_date",)
+
+
+def _migrate(engine):
+    """
+    Bring schema of an already existing database up to date.
+    create_all only creates missing tables, columns and indexes of existing tables are created here.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    if column.name == "timestamp":
+                        _backfill_timestamps(connection, table.name)
+        if "ux_pwdata_site" not in {index["name"] for index in inspector.get_indexes("pwdata")}:
+            _move_duplicates_to_history(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        for index_name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+
+def _backfill_timestamps(connection, table_name: str) -> None:
+    """
+    Fill the new timestamp column from date strings (DATE_FORMAT, local time) of existing rows.
+    Rows with a date in other format keep NULL timestamp.
+    """
+    # dd.mm.YYYY-HH:MM:SS -> YYYY-mm-dd HH:MM:SS, "utc" modifier converts local time to UTC
+    iso_date = "substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2) || ' ' || substr(date, 12, 8)"
+    connection.execute(text(f"UPDATE {table_name} SET timestamp = CAST(strftime('%s', {iso_date}, 'utc') AS INTEGER) "
+                            f"WHERE timestamp IS NULL AND date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]-*'"))
+
+
+def _move_duplicates_to_history(connection) -> None:
+    """
+    Keep only the newest row of every site in pwdata, older rows are moved to pwhistory.
+    Databases created before history was introduced have a new row for every save of a site.
+    """
+    newest = "SELECT MAX(id) FROM pwdata GROUP BY site"
+    connection.execute(text(f"INSERT INTO pwhistory (site, date, pw, timestamp) SELECT site, date, pw, timestamp FROM pwdata "
+                            f"WHERE id NOT IN ({newest}) ORDER BY id"))
+    connection.execute(text(f"DELETE FROM pwdata WHERE id NOT IN ({newest})"))
+
 
 class SessionManager():
     def __init__(self, engine) -> None:
@@ -28,15 +281,30 @@ class SessionManager():
     
     
 class DBHandler:
-    def __init__(self, database_url: str = 'sqlite:///main.db') -> None:
+    def __init__(self, database_url: str = DEFAULT_DATABASE_URL, profile: str = DEFAULT_PROFILE) -> None:
         """
         Initialize the DBHandler with the specified database URL.
+        Engine is shared by all DBHandlers of the same URL and profile, so creating DBHandler is cheap.
 
         Args:
             database_url (str): The URL of the database (default is 'sqlite:///main.db').
+            profile (str): SQLite profile from SQLITE_PROFILES (default is 'durable').
         """
-        self._engine = create_engine(database_url)
-        Base.metadata.create_all(bind=self._engine)
+        self._engine = engine_registry.get_engine(database_url, profile)
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+    def subscribe(self, callback: Callable[[List[str]], None]) -> None:
+        """
+        Register callback called with list of site names after they are saved
+
+        Args:
+            callback (Callable[[List[str]], None]): Called after every committed save
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, sites: List[str]) -> None:
+        for callback in self._listeners:
+            callback(sites)
 
     def _create_session(self):
         """
@@ -56,20 +324,128 @@ class DBHandler:
         """
         session.close()
 
-    def save_password(self, site: str, password: bytes, date: str = current_date_time()):
+    def save_password(self, site: str, password: bytes, date: Optional[str] = None, fingerprint: Optional[bytes] = None):
         """
         Save a password for a specific site in the database.
+        If the site is already saved, its current password is moved to the history.
 
         Args:
             site (str): The name of the site.
             password (bytes): The password to be saved.
         (Optional)
-            date (str): Date of that password
+            date (str): Date of that password in DATE_FORMAT, default is now.
+                Date in other format is saved without timestamp, like dates of migrated rows.
+            fingerprint (bytes): Fingerprint of the password from CryptoManager.fingerprint
+
+        Raises:
+            ValueError: If site is one of RESERVED_SITES
+        """
+        self._check_site(site)
+        with SessionManager(self._engine) as session:
+            self._save_rows(session, [self._row(site, password, date, fingerprint)])
+            session.commit()
+        self._notify([site])
+
+    def _save_reserved_password(self, site: str, password: bytes, date: Optional[str] = None) -> None:
+        """
+        Save a row of RESERVED_SITES (MAINPW, MAINKEY). Only for the vault code - saving these sites
+        by save_password or save_passwords is rejected, it would overwrite keys of the vault.
         """
+        if site not in RESERVED_SITES:
+            raise ValueError(f"Site {site} is not reserved")
         with SessionManager(self._engine) as session:
-            session.add_all([Password(site=site, pw=password, date = date)])
+            self._save_rows(session, [self._row(site, password, date)])
             session.commit()
 
+    @staticmethod
+    def _check_site(site: str) -> None:
+        """
+        Raises:
+            ValueError: If site is one of RESERVED_SITES
+        """
+        if site in RESERVED_SITES:
+            raise ValueError(f"Site name {site} is reserved")
+
+    def save_passwords(self, passwords: Iterable[Tuple], batch_size: int = 1000) -> int:
+        """
+        Save many passwords at once. Rows are consumed lazily from the iterable
+        and inserted in chunks, each chunk in a single transaction.
+        Rows are saved in order - if a site is saved more times, its last row is the current password
+        and the previous ones are in the history.
+
+        Args:
+            passwords (Iterable[Tuple]): (site, password, date) or (site, password, date, fingerprint) tuples,
+                date in DATE_FORMAT or None - current date is used. Date in other format is saved without timestamp.
+        (Optional)
+            batch_size (int): Number of rows inserted per transaction
+
+        Raises:
+            ValueError: If batch_size is less than 1, or a site is one of RESERVED_SITES -
+                batches before the batch with the reserved site stay saved
+
+        Returns:
+            int: Number of saved rows
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+
+        passwords = iter(passwords)
+        saved = 0
+        with SessionManager(self._engine) as session:
+            while True:
+                batch = [self._row(*row) for row in islice(passwords, batch_size)]
+                if not batch:
+                    break
+                for row in batch:
+                    self._check_site(row["site"])
+                self._save_rows(session, batch)
+                session.commit()
+                saved += len(batch)
+                self._notify([row["site"] for row in batch])
+        return saved
+
+    @staticmethod
+    def _row(site: str, password: bytes, date: Optional[str], fingerprint: Optional[bytes] = None) -> dict:
+        """
+        Returns row values of a saved password, date and timestamp are set to now if date is None.
+        Timestamp of a date in other format than DATE_FORMAT is None, same as _backfill_timestamps does.
+        """
+        if date is None:
+            timestamp = _current_timestamp()
+            date = datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT)
+        else:
+            try:
+                timestamp = date_to_timestamp(date)
+            except ValueError:
+                timestamp = None
+        return {"site": site, "pw": password, "date": date, "timestamp": timestamp, "fingerprint": fingerprint}
+
+    def _save_rows(self, session, rows: List[dict]) -> None:
+        """
+        Save {"site", "pw", "date", "timestamp", "fingerprint"} rows in the session. Current rows of already saved sites are copied
+        to the history and updated in place, so ids of sites do not change.
+        """
+        latest = {}
+        superseded = []
+        for row in rows:
+            if row["site"] in latest:
+                superseded.append(latest[row["site"]])
+            latest[row["site"]] = row
+
+        existing = dict(session.execute(select(Password.site, Password.id).where(Password.site.in_(list(latest)))).all())
+        if existing:
+            # Old passwords are copied inside the database, blobs are not loaded
+            history = select(Password.site, Password.date, Password.pw, Password.timestamp, Password.fingerprint)
+            history = history.where(Password.id.in_(list(existing.values()))).order_by(Password.id)
+            session.execute(insert(PasswordHistory.__table__).from_select(["site", "date", "pw", "timestamp", "fingerprint"],
+                                                                          history))
+            session.execute(update(Password), [{"id": existing[site], **row} for site, row in latest.items() if site in existing])
+        if superseded:
+            session.execute(insert(PasswordHistory.__table__), superseded)
+        new_rows = [row for site, row in latest.items() if site not in existing]
+        if new_rows:
+            session.execute(insert(Password.__table__), new_rows)
+
     def get_password(self, site: str) -> bytes:
         """
         Retrieve the password for a specific site from the database.
@@ -84,22 +460,250 @@ class DBHandler:
             ValueError: If the site is not found in the database.
         """
         with self._create_session() as session:
-            pw_data = session.query(Password).filter(Password.site == site).first()
-            if pw_data:
-                return pw_data.pw
+            # Only pw column is loaded, row is found through unique ux_pwdata_site index
+            pw_data = session.execute(select(Password.pw).where(Password.site == site)).scalar_one_or_none()
+            if pw_data is not None:
+                return pw_data
             else:
                 raise ValueError("Site is not in the database!")
 
+    def get_history(self, site: str, limit: Optional[int] = None, before_id: Optional[int] = None) -> List[PasswordRow]:
+        """
+        Return one page of previous passwords of site, newest first. Current password is not included.
+
+        Args:
+            site (str): The name of the site.
+        (Optional)
+            limit (int): Maximal number of returned rows, None means no limit
+            before_id (int): Cursor - pass id of the last row of the previous page to get the next page
+
+        Returns:
+            List[PasswordRow]: (id, site, date, pw, timestamp) tuples, id is id of the history row
+        """
+        query = select(PasswordHistory.id, PasswordHistory.site, PasswordHistory.date, PasswordHistory.pw,
+                       PasswordHistory.timestamp)
+        query = query.where(PasswordHistory.site == site)
+        if before_id is not None:
+            query = query.where(PasswordHistory.id < before_id)
+        query = query.order_by(PasswordHistory.id.desc()).limit(limit)
+        with self._create_session() as session:
+            return [PasswordRow(*row) for row in session.execute(query)]
+
+    def iter_history(self, site: str, batch_size: int = 100) -> Iterator[PasswordRow]:
+        """
+        Stream previous passwords of site, newest first. Rows are fetched page by page.
+
+        Args:
+            site (str): The name of the site.
+        (Optional)
+            batch_size (int): Number of rows fetched by one query
+
+        Yields:
+            PasswordRow: (id, site, date, pw, timestamp) tuples
+        """
+        before_id = None
+        while True:
+            page = self.get_history(site, limit=batch_size, before_id=before_id)
+            yield from page
+            if len(page) < batch_size:
+                return
+            before_id = page[-1].id
+
+    def get_meta(self) -> Dict[str, str]:
+        """
+        Return all metadata of the vault
+
+        Returns:
+            Dict[str, str]: key -> value
+        """
+        with self._create_session() as session:
+            return dict(session.execute(select(VaultMeta.key, VaultMeta.value)).all())
+
     def get_all_sites(self) -> List[str]:
         """
-        Return a list of site names from the database - except MAINPW.
+        Return a list of site names from the database - except RESERVED_SITES (MAINPW, MAINKEY).
 
         Returns:
             List[str]: List of strings containing site names.
         """
+        return [entry.site for entry in self.iter_sites()]
+
+    def get_sites(self, limit: Optional[int] = None, after_id: Optional[int] = None, offset: int = 0) -> List[SiteEntry]:
+        """
+        Return one page of sites ordered by id - except RESERVED_SITES. Password column is never loaded.
+
+        (Optional)
+            limit (int): Maximal number of returned sites, None means no limit
+            after_id (int): Cursor - only sites with id greater than after_id are returned.
+                Pass id of the last entry of the previous page to get the next page.
+            offset (int): Number of skipped sites, prefer after_id for large tables
+
+        Returns:
+            List[SiteEntry]: (id, site, date, timestamp) tuples
+        """
+        query = select(Password.id, Password.site, Password.date, Password.timestamp).where(Password.site.notin_(RESERVED_SITES))
+        if after_id is not None:
+            query = query.where(Password.id > after_id)
+        query = query.order_by(Password.id).offset(offset).limit(limit)
+        with self._create_session() as session:
+            return [SiteEntry(*row) for row in session.execute(query)]
+
+    def iter_sites(self, batch_size: int = 1000) -> Iterator[SiteEntry]:
+        """
+        Stream all sites ordered by id - except RESERVED_SITES. Sites are fetched page by page,
+        so memory usage does not depend on the number of sites.
+
+        (Optional)
+            batch_size (int): Number of sites fetched by one query
+
+        Yields:
+            SiteEntry: (id, site, date, timestamp) tuples
+        """
+        after_id = None
+        while True:
+            page = self.get_sites(limit=batch_size, after_id=after_id)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1].id
+
+
+    def get_changed(self, since: Optional[int] = None, until: Optional[int] = None, limit: Optional[int] = None,
+                    after: Optional[Tuple[int, int]] = None) -> List[SiteEntry]:
+        """
+        Return one page of sites saved in time range ordered by timestamp and id - except RESERVED_SITES.
+        Rows are found through ix_pwdata_timestamp index, password column is never loaded.
+        Sites without timestamp (date in unknown format before migration) are not returned.
+
+        (Optional)
+            since (int): Epoch seconds, only sites saved at since or later are returned
+            until (int): Epoch seconds, only sites saved before until are returned
+            limit (int): Maximal number of returned sites, None means no limit
+            after (Tuple[int, int]): Cursor - (timestamp, id) of the last entry of the previous page
+
+        Returns:
+            List[SiteEntry]: (id, site, date, timestamp) tuples
+        """
+        query = select(Password.id, Password.site, Password.date, Password.timestamp)
+        query = query.where(Password.timestamp.is_not(None), Password.site.notin_(RESERVED_SITES))
+        if since is not None:
+            query = query.where(Password.timestamp >= since)
+        if until is not None:
+            query = query.where(Password.timestamp < until)
+        if after is not None:
+            query = query.where(tuple_(Password.timestamp, Password.id) > tuple_(*after))
+        query = query.order_by(Password.timestamp, Password.id).limit(limit)
+        with self._create_session() as session:
+            return [SiteEntry(*row) for row in session.execute(query)]
+
+    def iter_changed(self, since: Optional[int] = None, until: Optional[int] = None,
+                     batch_size: int = 1000) -> Iterator[SiteEntry]:
+        """
+        Stream sites saved in time range ordered by timestamp and id (oldest first), page by page.
+        E.g. iter_changed(since=T) streams entries changed since T.
+
+        (Optional)
+            since (int): Epoch seconds, only sites saved at since or later are returned
+            until (int): Epoch seconds, only sites saved before until are returned
+            batch_size (int): Number of sites fetched by one query
+
+        Yields:
+            SiteEntry: (id, site, date, timestamp) tuples
+        """
+        after = None
+        while True:
+            page = self.get_changed(since, until, limit=batch_size, after=after)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = (page[-1].timestamp, page[-1].id)
+
+    def iter_rows(self, batch_size: int = 1000, after_id: Optional[int] = None, include_reserved: bool = True,
+                  without_fingerprint: bool = False) -> Iterator[PasswordRow]:
+        """
+        Stream rows including encrypted passwords ordered by id. Rows are fetched page by page.
+
+        (Optional)
+            batch_size (int): Number of rows fetched by one query
+            after_id (int): Only rows with id greater than after_id are returned
+            include_reserved (bool): Include rows of RESERVED_SITES (MAINPW, MAINKEY)
+            without_fingerprint (bool): Return only rows without fingerprint
+
+        Yields:
+            PasswordRow: (id, site, date, pw, timestamp) tuples
+        """
+        return self._iter_table_rows(Password, batch_size, after_id, include_reserved, without_fingerprint)
+
+    def iter_history_rows(self, batch_size: int = 1000, after_id: Optional[int] = None,
+                          include_reserved: bool = True, without_fingerprint: bool = False) -> Iterator[PasswordRow]:
+        """
+        Stream history rows of all sites ordered by id (oldest first). Rows are fetched page by page.
+
+        (Optional)
+            batch_size (int): Number of rows fetched by one query
+            after_id (int): Only rows with id greater than after_id are returned
+            include_reserved (bool): Include rows of RESERVED_SITES (MAINPW, MAINKEY)
+            without_fingerprint (bool): Return only rows without fingerprint
+
+        Yields:
+            PasswordRow: (id, site, date, pw, timestamp) tuples, id is id of the history row
+        """
+        return self._iter_table_rows(PasswordHistory, batch_size, after_id, include_reserved, without_fingerprint)
+
+    def _iter_table_rows(self, table, batch_size: int, after_id: Optional[int], include_reserved: bool,
+                         without_fingerprint: bool = False) -> Iterator[PasswordRow]:
+        query = select(table.id, table.site, table.date, table.pw, table.timestamp).order_by(table.id).limit(batch_size)
+        if not include_reserved:
+            query = query.where(table.site.notin_(RESERVED_SITES))
+        if without_fingerprint:
+            query = query.where(table.fingerprint.is_(None))
+        while True:
+            page_query = query if after_id is None else query.where(table.id > after_id)
+            with self._create_session() as session:
+                page = [PasswordRow(*row) for row in session.execute(page_query)]
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1].id
+
+    def save_fingerprints(self, fingerprints: Iterable[Tuple[int, bytes]], history: bool = False) -> int:
+        """
+        Set fingerprints of already saved rows in one transaction
+
+        Args:
+            fingerprints (Iterable[Tuple[int, bytes]]): (id, fingerprint) tuples
+        (Optional)
+            history (bool): Ids are ids of pwhistory rows
+
+        Returns:
+            int: Number of updated rows
+        """
+        rows = [{"id": row_id, "fingerprint": fingerprint} for row_id, fingerprint in fingerprints]
+        if rows:
+            with self._create_session() as session:
+                session.execute(update(PasswordHistory if history else Password), rows)
+                session.commit()
+        return len(rows)
+
+    def get_reused(self) -> List[List[str]]:
+        """
+        Returns groups of sites with the same current password, the largest group first.
+        Groups are found by one query grouping the fingerprint index, no password is loaded or decrypted.
+        Sites without fingerprint are not compared.
+
+        Returns:
+            List[List[str]]: Site names of every reused password, ordered by id (order of saving)
+        """
+        reused = select(Password.fingerprint).where(Password.fingerprint.is_not(None))
+        reused = reused.group_by(Password.fingerprint).having(func.count() > 1)
+        query = select(Password.fingerprint, Password.id, Password.site).where(Password.fingerprint.in_(reused))
+        query = query.order_by(Password.fingerprint, Password.id)
         with self._create_session() as session:
-            pw_data = session.query(Password).filter(Password.site != "MAINPW").all()
-            return [data.site for data in pw_data]
+            rows = session.execute(query).all()
+        groups = [list(group) for _, group in groupby(rows, key=lambda row: row.fingerprint)]
+        # Groups of the same size are ordered by their first site
+        groups.sort(key=lambda group: (-len(group), group[0].id))
+        return [[row.site for row in group] for group in groups]
 
 
 if __name__ == '__main__':
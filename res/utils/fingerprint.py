@@ -0,0 +1,55 @@
+from itertools import islice
+from typing import List, Optional, Tuple
+import time
+
+from .db import DBHandler
+from .hsh import CryptoManager
+from .pool import JobStats, map_chunks
+
+# CryptoManager of a worker process, set by _init_worker
+_crypto = None
+
+
+def _init_worker(key: bytes) -> None:
+    global _crypto
+    _crypto = CryptoManager.from_key(key)
+
+
+def _fingerprint_chunk(chunk: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+    """
+    Decrypt passwords and return their fingerprints
+    """
+    return [(row_id, _crypto.fingerprint(_crypto._cipher.decrypt(pw))) for row_id, pw in chunk]
+
+
+def backfill_fingerprints(db_handle: DBHandler, data_crypto: CryptoManager, chunk_size: int = 1000,
+                          workers: Optional[int] = None) -> JobStats:
+    """
+    Compute missing fingerprints of current and history passwords, e.g. of a vault saved before
+    fingerprints were introduced. Passwords are decrypted and fingerprinted in worker processes,
+    each chunk is saved in one transaction. Only rows without fingerprint are processed,
+    so an interrupted backfill continues where it stopped when called again.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+        data_crypto (CryptoManager): CryptoManager of the data key, returned by Vault.unlock
+    (Optional)
+        chunk_size (int): Number of rows fingerprinted by one task and saved in one transaction
+        workers (int): Number of worker processes, None means number of CPUs, 0 means no worker processes
+
+    Returns:
+        JobStats: Number of fingerprinted rows and duration
+    """
+    start = time.perf_counter()
+    count = 0
+    tables = (
+        (False, db_handle.iter_rows(batch_size=chunk_size, include_reserved=False, without_fingerprint=True)),
+        (True, db_handle.iter_history_rows(batch_size=chunk_size, include_reserved=False, without_fingerprint=True)),
+    )
+    for history, table_rows in tables:
+        rows = ((row.id, row.pw) for row in table_rows)
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+        for chunk in map_chunks(_fingerprint_chunk, chunks, workers, initializer=_init_worker,
+                                initargs=(data_crypto._key,)):
+            count += db_handle.save_fingerprints(chunk, history=history)
+    return JobStats(count, time.perf_counter() - start)
@@ -1,7 +1,20 @@
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.fernet import Fernet
-import base64
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import base64, ctypes, hashlib, hmac, os, threading, time
+
+from .pool import map_chunks
+
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+except ImportError:
+    # Argon2id is available in cryptography >= 44
+    Argon2id = None
 
 
 class WrongPasswordError(Exception):
@@ -17,15 +30,228 @@ class WrongPasswordError(Exception):
         return self.msg
 
 
+class _KeyCache:
+    """
+    Process local cache of derived keys, so the expensive key derivation is done once per unlock.
+    Entries are keyed by (password hash, salt, KDF name and cost). Keys are kept in bytearrays which are
+    locked in memory where the platform allows it and overwritten with zeros on eviction.
+    """
+
+    def __init__(self) -> None:
+        self._keys: Dict[Tuple[bytes, bytes, tuple], Tuple[bytearray, object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(password: str, salt: bytes, kdf: tuple) -> Tuple[bytes, bytes, tuple]:
+        return hashlib.sha256(password.encode()).digest(), bytes(salt), kdf
+
+    def get(self, password: str, salt: bytes, kdf: tuple, derive: Callable[[], bytes]) -> bytes:
+        """
+        Returns cached key, key is derived by derive callable if it is not cached yet
+        """
+        cache_key = self._cache_key(password, salt, kdf)
+        with self._lock:
+            if cache_key not in self._keys:
+                buffer = bytearray(derive())
+                self._keys[cache_key] = (buffer, self._mlock(buffer))
+            return bytes(self._keys[cache_key][0])
+
+    def evict(self, password: str, salt: bytes, kdf: tuple) -> None:
+        """
+        Removes one key from the cache and overwrites it with zeros
+        """
+        with self._lock:
+            entry = self._keys.pop(self._cache_key(password, salt, kdf), None)
+            if entry:
+                self._zeroize(*entry)
+
+    def clear(self) -> None:
+        """
+        Removes all keys from the cache and overwrites them with zeros
+        """
+        with self._lock:
+            for entry in self._keys.values():
+                self._zeroize(*entry)
+            self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _mlock(buffer: bytearray):
+        """
+        Best effort attempt to keep key out of swap, returns ctypes view of locked memory or None
+        """
+        try:
+            view = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+            if ctypes.CDLL(None).mlock(ctypes.addressof(view), len(buffer)) == 0:
+                return view
+        except (AttributeError, OSError, TypeError):
+            pass
+        return None
+
+    @staticmethod
+    def _zeroize(buffer: bytearray, view) -> None:
+        buffer[:] = bytes(len(buffer))
+        if view is not None:
+            ctypes.CDLL(None).munlock(ctypes.addressof(view), len(buffer))
+
+
+_key_cache = _KeyCache()
+
+
+def clear_key_cache() -> None:
+    """
+    Forget all derived keys - call it when the vault is locked
+    """
+    _key_cache.clear()
+
+
+def _map_chunks(fnc: Callable[[list], list], items: Iterable, workers: int, chunk_size: int) -> Iterator:
+    """
+    Lazily apply fnc to chunks of items and yield results one by one in the input order.
+    With workers > 0 chunks are processed by a thread pool, see pool.map_chunks.
+    """
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    for result in map_chunks(fnc, chunks, workers, ThreadPoolExecutor):
+        yield from result
+
+
+def _derive_pbkdf2(password: bytes, salt: bytes, iterations: int) -> bytes:
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), iterations=iterations, salt=salt, length=32)
+    return kdf.derive(password)
+
+
+def _derive_scrypt(password: bytes, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return Scrypt(salt=salt, length=32, n=n, r=r, p=p).derive(password)
+
+
+def _derive_argon2id(password: bytes, salt: bytes, iterations: int, memory_cost: int, lanes: int) -> bytes:
+    if Argon2id is None:
+        raise ValueError("Argon2id is not supported by installed cryptography package")
+    return Argon2id(salt=salt, length=32, iterations=iterations, lanes=lanes, memory_cost=memory_cost).derive(password)
+
+
+# Key derivation functions: name -> (derive function, names of its cost parameters)
+# Derive function gets password, salt and cost parameters as kwargs and returns 32 bytes
+KDF_BACKENDS: Dict[str, Tuple[Callable[..., bytes], Tuple[str, ...]]] = {
+    "pbkdf2-sha256": (_derive_pbkdf2, ("iterations",)),
+    "scrypt": (_derive_scrypt, ("n", "r", "p")),
+    "argon2id": (_derive_argon2id, ("iterations", "memory_cost", "lanes")),
+}
+
+# Named parameter sets: name -> (KDF name, cost parameters)
+KDF_PRESETS: Dict[str, Tuple[str, Dict[str, int]]] = {
+    "pbkdf2": ("pbkdf2-sha256", {"iterations": 600000}),
+    "scrypt-interactive": ("scrypt", {"n": 2 ** 14, "r": 8, "p": 1}),
+    "scrypt": ("scrypt", {"n": 2 ** 17, "r": 8, "p": 1}),
+    "argon2id": ("argon2id", {"iterations": 2, "memory_cost": 19456, "lanes": 1}),
+    "argon2id-rfc9106": ("argon2id", {"iterations": 3, "memory_cost": 65536, "lanes": 4}),
+}
+
+
+def register_kdf(name: str, derive: Callable[..., bytes], cost_names: Tuple[str, ...]) -> None:
+    """
+    Add key derivation function
+
+    Args:
+        name (str): Name saved in the vault metadata
+        derive (Callable[..., bytes]): Function (password, salt, **cost) -> 32 bytes
+        cost_names (Tuple[str, ...]): Names of cost parameters
+    """
+    KDF_BACKENDS[name] = (derive, cost_names)
+
+
+def available_presets() -> List[str]:
+    """
+    Returns presets supported by installed packages
+    """
+    return [name for name, (algorithm, _) in KDF_PRESETS.items() if algorithm != "argon2id" or Argon2id is not None]
+
+
+class KDFParams(NamedTuple):
+    """
+    Parameters of the key derivation of one vault
+    """
+    salt: bytes
+    cost: Dict[str, int]
+    algorithm: str = "pbkdf2-sha256"
+
+    @property
+    def iterations(self) -> Optional[int]:
+        return self.cost.get("iterations")
+
+    @classmethod
+    def generate(cls, iterations: Optional[int] = None, preset: Optional[str] = None) -> "KDFParams":
+        """
+        Returns parameters with a new random salt
+
+        (Optional)
+            iterations (int): PBKDF2 iterations. Defaults to CryptoManager.ITERATIONS.
+            preset (str): Name from KDF_PRESETS, iterations are ignored if preset is given
+        """
+        if preset is not None:
+            if preset not in KDF_PRESETS:
+                raise ValueError(f"Unknown key derivation preset {preset}")
+            algorithm, cost = KDF_PRESETS[preset]
+            return cls(os.urandom(16), dict(cost), algorithm)
+        return cls(os.urandom(16), {"iterations": iterations or CryptoManager.ITERATIONS})
+
+    def with_new_salt(self) -> "KDFParams":
+        return self._replace(salt=os.urandom(16))
+
+    def to_dict(self) -> Dict[str, str]:
+        values = {"kdf": self.algorithm, "salt": self.salt.hex()}
+        values.update((name, str(value)) for name, value in self.cost.items())
+        return values
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, str]) -> "KDFParams":
+        if values["kdf"] not in KDF_BACKENDS:
+            raise ValueError(f"Unknown key derivation function {values['kdf']}")
+        _, cost_names = KDF_BACKENDS[values["kdf"]]
+        return cls(bytes.fromhex(values["salt"]), {name: int(values[name]) for name in cost_names}, values["kdf"])
+
+    def create_crypto(self, password: str) -> "CryptoManager":
+        """
+        Returns CryptoManager with key derived from password by these parameters
+        """
+        return CryptoManager(password, salt=self.salt, kdf=self.algorithm, kdf_cost=self.cost)
+
+
+def calibrate_iterations(target_seconds: float = 0.25, minimum: int = 100000) -> int:
+    """
+    Returns number of PBKDF2 iterations that takes about target_seconds on this machine.
+
+    Args:
+        target_seconds (float, optional): Wanted duration of the key derivation. Defaults to 0.25.
+        minimum (int, optional): Iterations are never lower than minimum. Defaults to 100000.
+    """
+    probe_iterations = 20000
+    start = time.perf_counter()
+    _derive_pbkdf2(b"calibration", os.urandom(16), probe_iterations)
+    elapsed = time.perf_counter() - start
+    iterations = int(probe_iterations * target_seconds / elapsed) // 1000 * 1000
+    return max(iterations, minimum)
+
+
 class CryptoManager:
     """
     This class is used for ecrypting and decrypting string
     """
 
+    ITERATIONS = 100000
+    VERIFIER_CONSTANT = b"pwmanager main password verifier"
+
     def __init__(self, password: str, *args, **kwargs) -> None:
         """
         Pass a password for encrypting and decrypting strings.
-        There is a posibility to add a salt kwarg that changes parameter for key generation
+        There is a posibility to add kwargs that change parameters for key generation:
+            salt (bytes): Defaults to the password
+            iterations (int): PBKDF2 iterations
+            kdf (str): Name of key derivation function from KDF_BACKENDS. Defaults to pbkdf2-sha256.
+            kdf_cost (Dict[str, int]): Cost parameters of kdf, e.g. {"n": 16384, "r": 8, "p": 1} for scrypt
 
         Args:
             password (str): String used for key generation
@@ -34,8 +260,84 @@ class CryptoManager:
             self._salt = password.encode()
         else:
             self._salt = kwargs["salt"]
+        self._kdf = kwargs.get("kdf", "pbkdf2-sha256")
+        self._kdf_cost = kwargs.get("kdf_cost", {"iterations": kwargs.get("iterations", self.ITERATIONS)})
+        if self._kdf not in KDF_BACKENDS:
+            raise ValueError(f"Unknown key derivation function {self._kdf}")
 
-        self._key = self._generate_key_from_password(password)
+        # Derived key is cached, so creating another CryptoManager with same password is cheap
+        self._key = _key_cache.get(password, self._salt, self._kdf_id(),
+                                   lambda: self._generate_key_from_password(password))
+        # One cipher object is reused by all encrypt and decrypt calls
+        self._cipher = Fernet(self._key)
+        self._fingerprint_key = None
+
+    @classmethod
+    def from_key(cls, key: bytes) -> "CryptoManager":
+        """
+        Create CryptoManager from already derived key (e.g. in a worker process), no key derivation is done
+
+        Args:
+            key (bytes): url-safe base64 encoded 32 bytes key
+        """
+        crypto_manager = cls.__new__(cls)
+        crypto_manager._salt = None
+        crypto_manager._kdf = None
+        crypto_manager._kdf_cost = None
+        crypto_manager._key = key
+        crypto_manager._cipher = Fernet(key)
+        crypto_manager._fingerprint_key = None
+        return crypto_manager
+
+    def lock(self, password: str) -> None:
+        """
+        Remove key derived from password from the key cache
+
+        Args:
+            password (str): Password passed to init method
+        """
+        _key_cache.evict(password, self._salt, self._kdf_id())
+
+    def _kdf_id(self) -> tuple:
+        return self._kdf, tuple(sorted(self._kdf_cost.items()))
+
+    def derive_subkey(self, purpose: bytes) -> bytes:
+        """
+        Returns 32 bytes key derived from the key by HKDF, keys for different purposes are independent
+        and none of them reveals the key
+
+        Args:
+            purpose (bytes): Name of the sub-key usage
+        """
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=purpose)
+        return hkdf.derive(base64.urlsafe_b64decode(self._key))
+
+    def verifier(self) -> bytes:
+        """
+        Returns HMAC of a constant under the verifier sub-key. Verifier can be saved next to the encrypted data,
+        it proves the key without decrypting anything.
+        """
+        return hmac.new(self.derive_subkey(b"verifier"), self.VERIFIER_CONSTANT, hashlib.sha256).digest()
+
+    def verify(self, verifier: bytes) -> bool:
+        """
+        Returns True if verifier was made by the same key, comparison is done in constant time
+        """
+        return hmac.compare_digest(self.verifier(), verifier)
+
+    def fingerprint(self, string: Union[str, bytes]) -> bytes:
+        """
+        Returns HMAC-SHA256 of the string under the fingerprint sub-key. Equal strings have equal fingerprints,
+        so reused passwords can be found without decrypting them. Without the key fingerprints can not be
+        computed, so they can not be used to guess the passwords.
+
+        Args:
+            string (Union[str, bytes]): String to fingerprint, str is utf-8 encoded
+        """
+        if self._fingerprint_key is None:
+            self._fingerprint_key = self.derive_subkey(b"fingerprint")
+        return hmac.new(self._fingerprint_key, string.encode() if isinstance(string, str) else string,
+                        hashlib.sha256).digest()
 
     def encrypt_string(self, string_to_encrypt: str) -> bytes:
         """
@@ -48,8 +350,7 @@ class CryptoManager:
         Returns:
             bytes: bytes string from which original string can be reconstructed
         """
-        cipher = Fernet(self._key)
-        encrypted_string = cipher.encrypt(string_to_encrypt.encode())
+        encrypted_string = self._cipher.encrypt(string_to_encrypt.encode())
         return encrypted_string
 
     def decrypt_string(self, bytes_to_decrypt: bytes) -> str:
@@ -66,22 +367,61 @@ class CryptoManager:
         Returns:
             str: If correct password is used, original string is returned
         """
-        cipher = Fernet(self._key)
         try:
-            decrypted_string = cipher.decrypt(bytes_to_decrypt).decode()
+            decrypted_string = self._cipher.decrypt(bytes_to_decrypt).decode()
         except Exception as e:
             raise WrongPasswordError("Wrong password")
 
         return decrypted_string
 
+    def encrypt_many(self, strings: Iterable[Union[str, bytes]], workers: int = 0, chunk_size: int = 256) -> Iterator[bytes]:
+        """
+        Encrypt many strings with one cipher object. Results are yielded lazily in the input order.
+
+        Args:
+            strings (Iterable[Union[str, bytes]]): strings to encrypt, str is utf-8 encoded
+        (Optional)
+            workers (int): Number of threads, 0 means encrypting in the calling thread
+            chunk_size (int): Number of strings processed by one thread task
+
+        Yields:
+            bytes: encrypted strings
+        """
+        def encrypt_chunk(chunk):
+            return [self._cipher.encrypt(item.encode() if isinstance(item, str) else item) for item in chunk]
+
+        return _map_chunks(encrypt_chunk, strings, workers, chunk_size)
+
+    def decrypt_many(self, tokens: Iterable[Union[str, bytes]], workers: int = 0, chunk_size: int = 256) -> Iterator[str]:
+        """
+        Decrypt many bytes strings with one cipher object. Results are yielded lazily in the input order.
+
+        Args:
+            tokens (Iterable[Union[str, bytes]]): encrypted strings
+        (Optional)
+            workers (int): Number of threads, 0 means decrypting in the calling thread
+            chunk_size (int): Number of strings processed by one thread task
+
+        Raises:
+            WrongPasswordError: If any string can not be decrypted
+
+        Yields:
+            str: original strings
+        """
+        def decrypt_chunk(chunk):
+            try:
+                return [self._cipher.decrypt(token).decode() for token in chunk]
+            except Exception as e:
+                raise WrongPasswordError("Wrong password")
+
+        return _map_chunks(decrypt_chunk, tokens, workers, chunk_size)
+
     def _generate_key_from_password(self, password):
         """
         Private method that generates key.
         """
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(), iterations=100000, salt=self._salt, length=32
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+        derive, _ = KDF_BACKENDS[self._kdf]
+        key = base64.urlsafe_b64encode(derive(password.encode(), self._salt, **self._kdf_cost))
         return key
 
 if __name__ == '__main__':
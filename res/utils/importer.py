@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+import csv, json, os, time
+
+from .db import DBHandler, RESERVED_SITES
+from .hsh import CryptoManager
+from .pool import JobStats, map_chunks
+
+try:
+    import ijson
+except ImportError:
+    # Without ijson JSON exports are loaded at once, JSON Lines are always streamed
+    ijson = None
+
+# Column names of site and password used by common password managers (Bitwarden, Chrome, Firefox,
+# LastPass, KeePass, 1Password), the first column found in the export is used
+SITE_FIELDS = ("name", "title", "account", "url", "login_uri", "web site", "hostname")
+PASSWORD_FIELDS = ("password", "login_password")
+
+# CryptoManager of a worker process, set by _init_worker
+_crypto = None
+
+
+@dataclass(frozen=True)
+class ImportStats(JobStats):
+    """
+    Result of import_entries
+    """
+    skipped: int = 0
+
+
+def _find_field(fields: Iterable[str], candidates: Tuple[str, ...]) -> Optional[str]:
+    """
+    Returns the first of candidates present in fields, comparison is case insensitive
+    """
+    lower_fields = {field.strip().lower(): field for field in fields}
+    for candidate in candidates:
+        if candidate in lower_fields:
+            return lower_fields[candidate]
+    return None
+
+
+def _entry_from_record(record: dict) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (site, password) of one record, nested "login" object of Bitwarden JSON is supported
+    """
+    login = record.get("login")
+    if isinstance(login, dict):
+        record = {**record, **login}
+        uris = login.get("uris") or []
+        if uris and isinstance(uris[0], dict):
+            record.setdefault("url", uris[0].get("uri"))
+    site_field = _find_field(record, SITE_FIELDS)
+    password_field = _find_field(record, PASSWORD_FIELDS)
+    return (record[site_field] if site_field else None,
+            record[password_field] if password_field else None)
+
+
+def parse_csv(path: str) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    """
+    Stream (site, password) entries of a CSV export. Header row is required.
+
+    Raises:
+        ValueError: If header has no site or password column
+    """
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        site_field = _find_field(header, SITE_FIELDS)
+        password_field = _find_field(header, PASSWORD_FIELDS)
+        if site_field is None or password_field is None:
+            raise ValueError(f"CSV header has no site or password column: {header}")
+        site_index, password_index = header.index(site_field), header.index(password_field)
+        for row in reader:
+            if len(row) > max(site_index, password_index):
+                yield row[site_index], row[password_index]
+            elif row:
+                yield None, None
+
+
+def parse_json(path: str) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    """
+    Stream (site, password) entries of a JSON export - list of records or object with "items" list
+    (Bitwarden). Export is streamed if ijson is installed.
+    """
+    with open(path, "rb") as file:
+        if ijson is not None:
+            prefix = "item" if file.read(64).lstrip()[:1] == b"[" else "items.item"
+            file.seek(0)
+            records = ijson.items(file, prefix)
+        else:
+            data = json.load(file)
+            records = data["items"] if isinstance(data, dict) else data
+        for record in records:
+            yield _entry_from_record(record) if isinstance(record, dict) else (None, None)
+
+
+def parse_json_lines(path: str) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    """
+    Stream (site, password) entries of a JSON Lines export, one record per line
+    """
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield _entry_from_record(json.loads(line))
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "json": parse_json,
+    "jsonl": parse_json_lines,
+}
+
+
+def parse_file(path: str, file_format: Optional[str] = None) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    """
+    Stream (site, password) entries of an export, format is guessed from the file extension if not given
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in PARSERS:
+        raise ValueError(f"Unknown export format {file_format}, use one of {', '.join(PARSERS)}")
+    return PARSERS[file_format](path)
+
+
+def _init_worker(key: bytes) -> None:
+    global _crypto
+    _crypto = CryptoManager.from_key(key)
+
+
+def _encrypt_chunk(chunk: List[Tuple[str, str]]) -> List[Tuple[str, bytes, None, bytes]]:
+    return [(site, _crypto._cipher.encrypt(password.encode()), None, _crypto.fingerprint(password)) for site, password in chunk]
+
+
+def import_entries(db_handle: DBHandler, data_crypto: CryptoManager, entries: Iterable[Tuple[Optional[str], Optional[str]]],
+                   batch_size: int = 1000, workers: Optional[int] = None) -> ImportStats:
+    """
+    Encrypt (site, password) entries and save them. Parsing, encryption and inserts are pipelined,
+    entries are consumed lazily so memory does not grow with the number of entries.
+    Entries without site or password and entries of RESERVED_SITES (e.g. MAINKEY) are skipped.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+        data_crypto (CryptoManager): CryptoManager of the data key, returned by Vault.unlock
+        entries (Iterable[Tuple[str, str]]): (site, password) entries, e.g. from parse_file
+    (Optional)
+        batch_size (int): Number of rows encrypted by one task and inserted per transaction
+        workers (int): Number of worker processes, None means number of CPUs, 0 means no worker processes
+
+    Returns:
+        ImportStats: Number of saved and skipped entries and duration
+    """
+    start = time.perf_counter()
+    skipped = 0
+
+    def valid_entries():
+        nonlocal skipped
+        for site, password in entries:
+            if site and password and site not in RESERVED_SITES:
+                yield site, password
+            else:
+                skipped += 1
+
+    valid = valid_entries()
+    chunks = iter(lambda: list(islice(valid, batch_size)), [])
+    encrypted = map_chunks(_encrypt_chunk, chunks, workers, initializer=_init_worker, initargs=(data_crypto._key,))
+    rows = (row for chunk in encrypted for row in chunk)
+    count = db_handle.save_passwords(rows, batch_size=batch_size)
+    return ImportStats(count, time.perf_counter() - start, skipped=skipped)
@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional
+import os
+
+
+@dataclass(frozen=True)
+class JobStats:
+    """
+    Result of a job processing rows in chunks, jobs with more results subclass it
+    """
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def map_chunks(fnc: Callable[[list], list], chunks: Iterable[list], workers: Optional[int], executor_cls=ProcessPoolExecutor,
+               initializer: Optional[Callable[..., None]] = None, initargs: tuple = ()) -> Iterator[list]:
+    """
+    Lazily apply fnc to chunks and yield results in the input order.
+    With workers > 0 chunks are processed by a pool of executor_cls, at most 2 * workers chunks are in flight,
+    so memory does not grow with the number of chunks.
+
+    Args:
+        fnc (Callable[[list], list]): Function processing one chunk, it has to be picklable for process pools
+        chunks (Iterable[list]): Chunks of items, consumed lazily
+        workers (int): Number of workers, None means number of CPUs, 0 means processing in the calling thread
+    (Optional)
+        executor_cls: ProcessPoolExecutor or ThreadPoolExecutor
+        initializer (Callable): Called with initargs once in every worker, or in the calling process without workers
+        initargs (tuple): Arguments of initializer
+
+    Yields:
+        list: Result of fnc for every chunk
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 0:
+        if initializer is not None:
+            initializer(*initargs)
+        for chunk in chunks:
+            yield fnc(chunk)
+        return
+
+    with executor_cls(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(fnc, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,8 +1,23 @@
+from typing import List, Optional
+from bisect import bisect_right
+from itertools import accumulate
+from math import comb, factorial
+import os, string
+
+
 class PWGenerator():
-    
+
+    # Characters that are easy to confuse with each other
+    AMBIGUOUS_CHARS = "0Oo1lI|`'\""
+
     def __init__(self, length: int = 12, *args, **kwargs) -> None:
         """
         Set total length of password
+        Password policy can be set by kwargs:
+            min_lower_case_letters, min_upper_case_letters, min_digits, min_symbols (int):
+                minimal number of characters from the group
+            exclude_ambiguous (bool): ambiguous characters like 0 and O are not used
+            max_repeats (int): maximal number of same consecutive characters
 
         Args:
             length (int, optional): Length of the random password. Defaults to 12.
@@ -15,9 +30,19 @@ class PWGenerator():
         self.upper_case_letters = True
         self.digits = True
         self.symbols = True
+
+        # Password policy
+        self.min_lower_case_letters = 0
+        self.min_upper_case_letters = 0
+        self.min_digits = 0
+        self.min_symbols = 0
+        self.exclude_ambiguous = False
+        self.max_repeats = None
         
         # Set values from kwargs
-        kwargs_parameters = ["lower_case_letters", "upper_case_letters", "digits", "symbols"]
+        kwargs_parameters = ["lower_case_letters", "upper_case_letters", "digits", "symbols",
+                             "min_lower_case_letters", "min_upper_case_letters", "min_digits", "min_symbols",
+                             "exclude_ambiguous", "max_repeats"]
         for param in kwargs_parameters:
             if param in kwargs:
                 setattr(self, param, kwargs[param])
@@ -28,17 +53,40 @@ class PWGenerator():
         """
         Initializes string of all posible characters
         """
-        import string
-        self._all_chars_list = []
-        if self.lower_case_letters:
-            self._all_chars_list.append(string.ascii_letters[:len(string.ascii_letters)//2])
-        if self.upper_case_letters:
-            self._all_chars_list.append(string.ascii_letters[len(string.ascii_letters)//2:])
-        if self.symbols:
-            self._all_chars_list.append(string.punctuation)
-        if self.digits:
-            self._all_chars_list.append(string.digits)
+        # (characters, minimal count) of every enabled group
+        groups = [
+            (self.lower_case_letters, string.ascii_letters[:len(string.ascii_letters)//2], self.min_lower_case_letters),
+            (self.upper_case_letters, string.ascii_letters[len(string.ascii_letters)//2:], self.min_upper_case_letters),
+            (self.symbols, string.punctuation, self.min_symbols),
+            (self.digits, string.digits, self.min_digits),
+        ]
+        self._groups = []
+        for enabled, chars, minimum in groups:
+            if self.exclude_ambiguous:
+                chars = "".join(c for c in chars if c not in self.AMBIGUOUS_CHARS)
+            if enabled:
+                self._groups.append((chars, minimum))
+            elif minimum:
+                raise ValueError("Minimal count is set for disabled group of characters")
+        if sum(minimum for _, minimum in self._groups) > self.length:
+            raise ValueError("Sum of minimal counts is greater than password length")
+        if self.max_repeats is not None and self.max_repeats < 1:
+            raise ValueError("Max repeats has to be at least 1")
+        if self.max_repeats is not None and any(len(chars) == 1 and minimum > self.max_repeats
+                                                for chars, minimum in self._groups):
+            raise ValueError("Minimal count of group with one character is greater than max repeats")
+
+        self._all_chars_list = [chars for chars, _ in self._groups]
         self._all_chars = "".join(self._all_chars_list)
+        # Group of every character and tables for drawing policy passwords, computed for each used length
+        self._char_groups = {c: chars for chars, _ in self._groups for c in chars}
+        self._policy_tables = {}
+
+        # Byte b is mapped to self._all_chars[b % size], bytes >= limit are rejected to avoid modulo bias
+        if self._all_chars:
+            self._limit = 256 - 256 % len(self._all_chars)
+            self._translate_table, self._rejected_bytes = _get_translate_table(self._all_chars)
+            self._group_tables = [_get_translate_table(chars) for chars in self._all_chars_list]
         
     def get_random_password(self) -> str:
         """
@@ -47,8 +95,166 @@ class PWGenerator():
         Returns:
             str: Random string representing password
         """
-        import random
-        password = ""
-        for _ in range(self.length):
-            password += random.choice(self._all_chars)
-        return password
\ No newline at end of file
+        return self.generate_many(1)[0]
+
+    def _has_policy(self) -> bool:
+        return self.max_repeats is not None or any(minimum for _, minimum in self._groups)
+
+    def generate_many(self, n: int, length: Optional[int] = None) -> List[str]:
+        """
+        Returns n random passwords. All passwords are cut from one buffer of random bytes from os.urandom.
+        Bytes are mapped to characters by bytes.translate, bytes that would cause modulo bias are dropped
+        (rejection sampling), so every character is equally likely.
+        If password policy is set, every password is constructed to meet it (see _get_policy_password).
+
+        Args:
+            n (int): Number of passwords
+        (Optional)
+            length (int): Length of passwords. Defaults to self.length.
+
+        Returns:
+            List[str]: Random passwords
+        """
+        length = self.length if length is None else length
+        if not self._all_chars:
+            raise ValueError("At least one group of characters has to be enabled")
+        if self._has_policy():
+            random_bytes = _RandomBuffer()
+            return [self._get_policy_password(length, random_bytes) for _ in range(n)]
+        needed = n * length
+        if needed <= 0:
+            return [""] * max(n, 0)
+
+        chars = bytearray()
+        while len(chars) < needed:
+            missing = needed - len(chars)
+            chars += os.urandom(missing * 256 // self._limit + 16).translate(self._translate_table, self._rejected_bytes)
+        text = chars[:needed].decode("ascii")
+        return [text[i:i + length] for i in range(0, needed, length)]
+
+    def _get_policy_tables(self, length: int) -> List[List[tuple]]:
+        """
+        Returns table tables[i][r] = (ks, cumulative weights) for drawing number of characters k of group i
+        when r characters remain. Weight of k is the number of strings of length r made of groups
+        i, i+1, ... with k characters of group i, where each group meets its minimal count
+        (max_repeats is not taken into account).
+        """
+        if length not in self._policy_tables:
+            counts = [[0] * (length + 1) for _ in range(len(self._groups) + 1)]
+            counts[-1][0] = 1
+            tables = [[None] * (length + 1) for _ in range(len(self._groups))]
+            for i in reversed(range(len(self._groups))):
+                chars, minimum = self._groups[i]
+                for r in range(length + 1):
+                    ks = list(range(minimum, r + 1))
+                    cumulative = list(accumulate(comb(r, k) * len(chars) ** k * counts[i + 1][r - k] for k in ks))
+                    counts[i][r] = cumulative[-1] if cumulative else 0
+                    tables[i][r] = (ks, cumulative)
+            self._policy_tables[length] = tables
+        return self._policy_tables[length]
+
+    def _get_policy_password(self, length: int, random_bytes: "_RandomBuffer") -> str:
+        """
+        Returns password meeting the policy, constructed in one pass without retries.
+        1) Number of characters of every group is drawn with probability proportional to the number
+           of passwords with such counts
+        2) Characters are drawn from the groups
+        3) Characters are shuffled
+        Every password meeting minimal counts is equally likely. If max_repeats is set, a character that
+        would make too long run is replaced by another character of the same group.
+        """
+        tables = self._get_policy_tables(length)
+        total = tables[0][length][1][-1] if tables[0][length][1] else 0
+        if not total:
+            raise ValueError("Sum of minimal counts is greater than password length")
+
+        password = []
+        remaining = length
+        for i in range(len(self._groups)):
+            # Step 1 number of characters of the group, last group takes the rest
+            if i == len(self._groups) - 1:
+                k = remaining
+            else:
+                ks, cumulative = tables[i][remaining]
+                k = ks[bisect_right(cumulative, random_bytes.randbelow(cumulative[-1]))]
+            # Step 2 characters of the group
+            password += random_bytes.chars(self._group_tables[i], k)
+            remaining -= k
+
+        # Step 3 Fisher-Yates shuffle, all swaps are decoded from one random integer from [0, length!)
+        code = random_bytes.randbelow(factorial(length))
+        for i in reversed(range(1, length)):
+            code, j = divmod(code, i + 1)
+            password[i], password[j] = password[j], password[i]
+
+        if self.max_repeats is not None:
+            run_length = 1
+            for i in range(1, length):
+                if password[i] == password[i - 1]:
+                    run_length += 1
+                    if run_length > self.max_repeats:
+                        chars = self._char_groups[password[i]].replace(password[i], "")
+                        if not chars:
+                            raise ValueError("Max repeats can not be kept with group of one character")
+                        password[i] = chars[random_bytes.randbelow(len(chars))]
+                        run_length = 1
+                else:
+                    run_length = 1
+        return "".join(password)
+
+
+class _RandomBuffer:
+    """
+    Buffered os.urandom. Integers and characters are drawn by rejection sampling, so they have no modulo bias.
+    """
+
+    def __init__(self, size: int = 4096) -> None:
+        self._size = size
+        self._buffer = b""
+        self._position = 0
+
+    def _read(self, nbytes: int) -> bytes:
+        if self._position + nbytes > len(self._buffer):
+            self._buffer = os.urandom(max(self._size, nbytes))
+            self._position = 0
+        self._position += nbytes
+        return self._buffer[self._position - nbytes:self._position]
+
+    def randbelow(self, n: int) -> int:
+        """
+        Returns random integer from range [0, n)
+        """
+        if n <= 256:
+            # One byte, bytes >= limit would cause modulo bias
+            limit = 256 - 256 % n
+            while True:
+                value = self._read(1)[0]
+                if value < limit:
+                    return value % n
+        bits = (n - 1).bit_length()
+        nbytes = (bits + 7) // 8
+        shift = nbytes * 8 - bits
+        while True:
+            value = int.from_bytes(self._read(nbytes), "big") >> shift
+            if value < n:
+                return value
+
+    def chars(self, table: tuple, k: int) -> str:
+        """
+        Returns k random characters, table is (translate table, rejected bytes) made by _get_translate_table
+        """
+        translate_table, rejected_bytes = table
+        result = b""
+        while len(result) < k:
+            result += self._read(k - len(result) + 8).translate(translate_table, rejected_bytes)
+        return result[:k].decode("ascii")
+
+
+def _get_translate_table(chars: str) -> tuple:
+    """
+    Returns (translate table, rejected bytes) mapping random byte b to chars[b % len(chars)],
+    bytes that would cause modulo bias are rejected
+    """
+    size = len(chars)
+    limit = 256 - 256 % size
+    return bytes(ord(chars[b % size]) for b in range(256)), bytes(range(limit, 256))
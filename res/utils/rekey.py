@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from itertools import islice
+from typing import List, Optional, Tuple
+import json, time
+
+from sqlalchemy import delete, update
+
+from cryptography.fernet import Fernet
+
+from .db import DBHandler, Password, PasswordHistory, RekeyState, MAIN_PASSWORD_SITE, DATA_KEY_SITE, current_date_time
+from .hsh import CryptoManager, KDFParams, WrongPasswordError
+from .pool import JobStats, map_chunks
+from .vault import kdf_meta_rows, load_kdf_params, unlock_data_crypto, verifier_meta_row
+
+# CryptoManagers of a worker process, set by _init_worker
+_old_crypto = None
+_new_crypto = None
+
+
+@dataclass(frozen=True)
+class RekeyStats(JobStats):
+    """
+    Result of rekey_vault, resumed is True if an unfinished re-key was continued
+    """
+    resumed: bool = False
+
+
+def _init_worker(old_key: bytes, new_key: bytes) -> None:
+    global _old_crypto, _new_crypto
+    _old_crypto = CryptoManager.from_key(old_key)
+    _new_crypto = CryptoManager.from_key(new_key)
+
+
+def _rekey_chunk(chunk: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes, bytes]]:
+    """
+    Decrypt passwords by the old key, encrypt them by the new key and fingerprint them under the new key
+    """
+    rekeyed = []
+    for row_id, pw in chunk:
+        password = _old_crypto._cipher.decrypt(pw)
+        rekeyed.append((row_id, _new_crypto._cipher.encrypt(password), _new_crypto.fingerprint(password)))
+    return rekeyed
+
+
+def rekey_vault(db_handle: DBHandler, old_password: str, new_password: str, chunk_size: int = 1000,
+                workers: Optional[int] = None, new_kdf_params: Optional[KDFParams] = None) -> RekeyStats:
+    """
+    Change main password and data key - every password is decrypted by the old data key and encrypted
+    by a new random data key. New data key is encrypted by the new main password.
+    Use Vault.change_password to change only the main password. Re-key is needed to rotate the data key
+    or to upgrade vault without data key.
+
+    Current passwords and then the password history are re-keyed in chunks,
+    each chunk is saved in one transaction together with the progress.
+    If the re-key is interrupted, call it again with the same passwords and it continues after
+    the last saved chunk. MAINPW, MAINKEY and KDF parameters are replaced in the last transaction,
+    so until the re-key is finished the old password is still the main password.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+        old_password (str): Current main password
+        new_password (str): New main password
+    (Optional)
+        chunk_size (int): Number of rows re-keyed in one transaction
+        workers (int): Number of worker processes, None means number of CPUs, 0 means no worker processes
+        new_kdf_params (KDFParams): Key derivation of the new main password.
+            Defaults to the current key derivation with a new salt.
+
+    Raises:
+        WrongPasswordError: If old password is not the main password, or an unfinished re-key
+            uses a different new password
+
+    Returns:
+        RekeyStats: Number of re-keyed rows and duration
+    """
+    start = time.perf_counter()
+
+    old_params = load_kdf_params(db_handle)
+    old_crypto = unlock_data_crypto(db_handle, old_password, old_params)
+
+    # Load progress of unfinished re-key or start a new one
+    with db_handle._create_session() as session:
+        state = session.get(RekeyState, 1)
+        resumed = state is not None
+        if resumed:
+            new_kdf_params = KDFParams.from_dict(json.loads(state.new_kdf))
+            new_main_crypto = new_kdf_params.create_crypto(new_password)
+            try:
+                if new_main_crypto.decrypt_string(state.new_main_pw) != new_password:
+                    raise WrongPasswordError("Unfinished re-key uses a different new password")
+            except WrongPasswordError:
+                new_main_crypto.lock(new_password)
+                raise
+            new_data_key = new_main_crypto.decrypt_string(state.new_data_key).encode()
+            last_id = state.last_id
+            history_last_id = state.history_last_id or 0
+        else:
+            if new_kdf_params is None:
+                new_kdf_params = old_params.with_new_salt() if old_params else KDFParams.generate()
+            new_main_crypto = new_kdf_params.create_crypto(new_password)
+            new_data_key = Fernet.generate_key()
+            last_id = history_last_id = 0
+            session.add(RekeyState(id=1, last_id=last_id, history_last_id=history_last_id,
+                                   new_main_pw=new_main_crypto.encrypt_string(new_password),
+                                   new_data_key=new_main_crypto.encrypt_string(new_data_key.decode()),
+                                   new_kdf=json.dumps(new_kdf_params.to_dict())))
+            session.commit()
+
+    count = 0
+    # Table, its rows after the saved progress and the progress column
+    tables = (
+        (Password, db_handle.iter_rows(batch_size=chunk_size, after_id=last_id, include_reserved=False), "last_id"),
+        (PasswordHistory, db_handle.iter_history_rows(batch_size=chunk_size, after_id=history_last_id,
+                                                      include_reserved=False), "history_last_id"),
+    )
+    for table, table_rows, progress_column in tables:
+        rows = ((row.id, row.pw) for row in table_rows)
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+        for chunk in map_chunks(_rekey_chunk, chunks, workers, initializer=_init_worker,
+                                initargs=(old_crypto._key, new_data_key)):
+            with db_handle._create_session() as session:
+                session.execute(update(table), [{"id": row_id, "pw": pw, "fingerprint": fingerprint}
+                                                for row_id, pw, fingerprint in chunk])
+                session.execute(update(RekeyState).where(RekeyState.id == 1).values({progress_column: chunk[-1][0]}))
+                session.commit()
+            count += len(chunk)
+
+    # Switch main password and data key and finish
+    with db_handle._create_session() as session:
+        state = session.get(RekeyState, 1)
+        session.execute(update(Password).where(Password.site == MAIN_PASSWORD_SITE).values(pw=state.new_main_pw))
+        session.execute(delete(Password).where(Password.site == DATA_KEY_SITE))
+        session.add(Password(site=DATA_KEY_SITE, pw=state.new_data_key, date=current_date_time()))
+        for row in kdf_meta_rows(new_kdf_params):
+            session.merge(row)
+        session.merge(verifier_meta_row(new_main_crypto))
+        session.delete(state)
+        session.commit()
+    new_main_crypto.lock(new_password)
+
+    return RekeyStats(count, time.perf_counter() - start, resumed=resumed)
@@ -0,0 +1,59 @@
+from json.encoder import encode_basestring_ascii
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO
+import time
+
+from .db import DBHandler
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class AgeEntry(NamedTuple):
+    """
+    One site of the password age report
+    """
+    site: str
+    date: str
+    timestamp: int
+    age_days: int
+
+    def to_json(self) -> str:
+        # Same output as json.dumps(self._asdict()), only strings need escaping
+        return (f'{{"site": {encode_basestring_ascii(self.site)}, "date": {encode_basestring_ascii(self.date)}, '
+                f'"timestamp": {self.timestamp}, "age_days": {self.age_days}}}')
+
+
+def iter_age_report(db_handle: DBHandler, older_than_days: Optional[int] = None, now: Optional[int] = None,
+                    batch_size: int = 5000) -> Iterator[AgeEntry]:
+    """
+    Stream sites ordered by the age of their current password, oldest first.
+    Sites are read page by page through the timestamp index, password blobs are never loaded.
+    Sites without timestamp (date in unknown format) are not reported.
+
+    Args:
+        db_handle (DBHandler): Database of the vault
+    (Optional)
+        older_than_days (int): Only passwords older than this number of days are reported
+        now (int): Epoch seconds the age is computed to, default is current time
+        batch_size (int): Number of sites fetched by one query
+
+    Yields:
+        AgeEntry: (site, date, timestamp, age_days) tuples
+    """
+    now = int(time.time()) if now is None else now
+    until = now - older_than_days * DAY_SECONDS if older_than_days is not None else None
+    for entry in db_handle.iter_changed(until=until, batch_size=batch_size):
+        yield AgeEntry(entry.site, entry.date, entry.timestamp, (now - entry.timestamp) // DAY_SECONDS)
+
+
+def write_ndjson(entries: Iterable[AgeEntry], file: TextIO) -> int:
+    """
+    Write entries as newline delimited JSON, one object per line as soon as it is produced
+
+    Returns:
+        int: Number of written entries
+    """
+    count = 0
+    for entry in entries:
+        file.write(entry.to_json() + "\n")
+        count += 1
+    return count
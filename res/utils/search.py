@@ -0,0 +1,143 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from typing import Dict, Iterable, List, Set, Tuple
+import threading
+from .db import RESERVED_SITES
+
+
+class SiteIndex:
+    """
+    In-memory search index over site names.
+    Names are kept in a sorted list for prefix search and in a positional trigram index
+    (trigram, position) -> names for substring search.
+    Index is updated incrementally - after it is attached to a DBHandler, every saved site is added.
+    Search is case insensitive and the index can be updated from worker threads.
+    """
+
+    def __init__(self, sites: Iterable[str] = ()) -> None:
+        """
+        Args:
+            sites (Iterable[str], optional): Site names indexed from the beginning
+        """
+        # Sorted list of lower case names for prefix search
+        self._sorted: List[str] = []
+        # Lower case name -> site names
+        self._names: Dict[str, List[str]] = {}
+        self._trigrams: Dict[Tuple[str, int], Set[str]] = {}
+        self._max_length = 0
+        self._lock = threading.Lock()
+        self.add_many(sites)
+
+    def attach(self, db_handle) -> "SiteIndex":
+        """
+        Index all sites of the database and keep index updated on every save
+
+        Args:
+            db_handle (DBHandler): Database with sites
+
+        Returns:
+            SiteIndex: self
+        """
+        self.add_many(entry.site for entry in db_handle.iter_sites())
+        db_handle.subscribe(self.add_many)
+        return self
+
+    def add(self, site: str) -> None:
+        """
+        Add one site name, already indexed and reserved names are ignored
+        """
+        with self._lock:
+            lower = self._add_name(site)
+            if lower is not None:
+                insort(self._sorted, lower)
+
+    def add_many(self, sites: Iterable[str]) -> None:
+        """
+        Add site names, already indexed and reserved names are ignored
+        """
+        with self._lock:
+            added = [lower for lower in map(self._add_name, sites) if lower is not None]
+            # One sort of the appended names is cheaper than many inserts
+            self._sorted.extend(added)
+            self._sorted.sort()
+
+    def _add_name(self, site: str):
+        """
+        Add name to the trigram index, returns lower case name if it is a new lower case name
+        """
+        if site in RESERVED_SITES:
+            return None
+        lower = site.lower()
+        names = self._names.get(lower)
+        if names is not None:
+            if site not in names:
+                names.append(site)
+            return None
+        self._names[lower] = [site]
+        self._max_length = max(self._max_length, len(lower))
+        for position in range(len(lower) - 2):
+            self._trigrams.setdefault((lower[position:position + 3], position), set()).add(lower)
+        return lower
+
+    def __len__(self) -> int:
+        return sum(len(names) for names in self._names.values())
+
+    def __contains__(self, site: str) -> bool:
+        return site in self._names.get(site.lower(), ())
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """
+        Return site names containing query. Results are ranked:
+        exact match, names starting with query (alphabetically), then names containing query
+        (earlier match first, then alphabetically).
+
+        Args:
+            query (str): Searched text
+        (Optional)
+            limit (int): Maximal number of results
+
+        Returns:
+            List[str]: Ranked site names
+        """
+        query = query.lower()
+        if not query or limit < 1:
+            return []
+
+        with self._lock:
+            results = self._search_prefix(query, limit)
+            if len(query) >= 3:
+                results.extend(self._search_substring(query, limit - len(results), set(results)))
+            return [site for lower in results for site in self._names[lower]][:limit]
+
+    def _search_prefix(self, query: str, limit: int) -> List[str]:
+        """
+        Return lower case names starting with query, exact match first
+        """
+        position = bisect_left(self._sorted, query)
+        results = []
+        for lower in self._sorted[position:position + limit]:
+            if not lower.startswith(query):
+                break
+            results.append(lower)
+        return results
+
+    def _search_substring(self, query: str, limit: int, found: Set[str]) -> List[str]:
+        """
+        Return lower case names containing query at position > 0, query has at least 3 characters.
+        Positions are searched from the beginning, so search stops as soon as limit is reached.
+        """
+        results = []
+        trigrams = [query[i:i + 3] for i in range(len(query) - 2)]
+        for position in range(1, self._max_length - len(query) + 1):
+            if len(results) >= limit:
+                break
+            # Consecutive trigrams at consecutive positions mean the whole query is at position
+            sets = [self._trigrams.get((trigram, position + i)) for i, trigram in enumerate(trigrams)]
+            if not all(sets):
+                continue
+            sets.sort(key=len)
+            matches = sets[0].intersection(*sets[1:]).difference(found)
+            matches = nsmallest(limit - len(results), matches)
+            found.update(matches)
+            results.extend(matches)
+        return results
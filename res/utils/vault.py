@@ -0,0 +1,270 @@
+from typing import List, Optional
+from cryptography.fernet import Fernet
+from sqlalchemy import update
+
+from .db import DBHandler, Password, RekeyState, VaultMeta, MAIN_PASSWORD_SITE, DATA_KEY_SITE, current_date_time
+from .hsh import CryptoManager, KDFParams, WrongPasswordError, calibrate_iterations
+
+# Vault metadata key of the main password verifier
+VERIFIER_KEY = "verifier"
+
+
+def load_kdf_params(db_handle: DBHandler) -> Optional[KDFParams]:
+    """
+    Returns parameters of the key derivation saved in the vault metadata,
+    None for vaults created before metadata were introduced
+    """
+    meta = db_handle.get_meta()
+    return KDFParams.from_dict(meta) if "kdf" in meta else None
+
+
+def create_main_crypto(password: str, params: Optional[KDFParams]) -> CryptoManager:
+    """
+    Returns CryptoManager of the main password, vaults without KDF parameters use password as a salt
+    """
+    return params.create_crypto(password) if params else CryptoManager(password)
+
+
+def verify_main_crypto(db_handle: DBHandler, main_crypto: CryptoManager) -> None:
+    """
+    Check that main_crypto is made from the main password. Verifier saved in the vault metadata is checked,
+    vaults without verifier are checked by decrypting MAINPW and the verifier is saved for the next time.
+
+    Raises:
+        WrongPasswordError: If main_crypto is not made from the main password
+        ValueError: If main password is not set
+    """
+    verifier = db_handle.get_meta().get(VERIFIER_KEY)
+    if verifier is not None:
+        if not main_crypto.verify(bytes.fromhex(verifier)):
+            raise WrongPasswordError("Wrong main password")
+        return
+    main_crypto.decrypt_string(db_handle.get_password(MAIN_PASSWORD_SITE))
+    with db_handle._create_session() as session:
+        session.merge(verifier_meta_row(main_crypto))
+        session.commit()
+
+
+def load_data_crypto(db_handle: DBHandler, main_crypto: CryptoManager) -> CryptoManager:
+    """
+    Returns CryptoManager of the data key, main_crypto has to be made from the main password.
+    Vaults created before data keys were introduced have passwords encrypted directly by the main key,
+    main_crypto is returned for them.
+
+    Raises:
+        WrongPasswordError: If main_crypto is not made from the main password
+    """
+    verify_main_crypto(db_handle, main_crypto)
+    try:
+        wrapped_data_key = db_handle.get_password(DATA_KEY_SITE)
+    except ValueError:
+        return main_crypto
+    return CryptoManager.from_key(main_crypto.decrypt_string(wrapped_data_key).encode())
+
+
+def unlock_data_crypto(db_handle: DBHandler, password: str, params: Optional[KDFParams]) -> CryptoManager:
+    """
+    Returns CryptoManager of the data key. Key of the main password is needed only to unwrap the data key,
+    it is evicted from the key cache afterwards - also if password is wrong.
+
+    Raises:
+        WrongPasswordError: If password is not the main password
+    """
+    main_crypto = create_main_crypto(password, params)
+    try:
+        return load_data_crypto(db_handle, main_crypto)
+    finally:
+        main_crypto.lock(password)
+
+
+def kdf_meta_rows(params: KDFParams) -> List[VaultMeta]:
+    """
+    Returns metadata rows holding params, use session.merge to save them
+    """
+    return [VaultMeta(key=key, value=value) for key, value in params.to_dict().items()]
+
+
+def verifier_meta_row(main_crypto: CryptoManager) -> VaultMeta:
+    """
+    Returns metadata row holding verifier of the main password, use session.merge to save it
+    """
+    return VaultMeta(key=VERIFIER_KEY, value=main_crypto.verifier().hex())
+
+
+class Vault:
+    """
+    Keys of the vault.
+    Passwords are encrypted by a random data key. Data key is encrypted by the key derived from the main
+    password and saved as MAINKEY, next to MAINPW (main password encrypted by itself).
+    Salt, KDF, its cost and a verifier of the main password are saved in the vault metadata.
+    Verifier is checked on unlock, so a wrong password is rejected after the key derivation without decrypting.
+    Changing the main password rewrites only MAINPW, MAINKEY and the metadata.
+    """
+
+    def __init__(self, db_handle: DBHandler) -> None:
+        """
+        Args:
+            db_handle (DBHandler): Database of the vault
+        """
+        self.db_handle = db_handle
+
+    def exists(self) -> bool:
+        """
+        Returns True if main password is set
+        """
+        try:
+            self.db_handle.get_password(MAIN_PASSWORD_SITE)
+            return True
+        except ValueError:
+            return False
+
+    def has_data_key(self) -> bool:
+        """
+        Returns False for vaults created before data keys were introduced, see rekey_vault
+        """
+        try:
+            self.db_handle.get_password(DATA_KEY_SITE)
+            return True
+        except ValueError:
+            return False
+
+    def has_unfinished_rekey(self) -> bool:
+        """
+        Returns True if rekey_vault was interrupted, call it again with the same passwords to finish it
+        """
+        with self.db_handle._create_session() as session:
+            return session.get(RekeyState, 1) is not None
+
+    @property
+    def kdf_params(self) -> Optional[KDFParams]:
+        """
+        Parameters of the key derivation, None for vaults created before metadata were introduced
+        """
+        return load_kdf_params(self.db_handle)
+
+    def create(self, password: str, iterations: Optional[int] = None, target_seconds: Optional[float] = None,
+               preset: Optional[str] = None) -> CryptoManager:
+        """
+        Set main password of a new vault and generate its data key and salt
+
+        Args:
+            password (str): Main password
+        (Optional)
+            iterations (int): Cost of the key derivation. Defaults to CryptoManager.ITERATIONS.
+            target_seconds (float): Iterations are calibrated so the key derivation takes target_seconds
+                on this machine, ignored if iterations are given
+            preset (str): Key derivation preset from KDF_PRESETS, e.g. "scrypt" or "argon2id".
+                Iterations and target_seconds are ignored if preset is given.
+
+        Raises:
+            ValueError: If main password is already set
+
+        Returns:
+            CryptoManager: CryptoManager of the data key - use it for encrypting passwords
+        """
+        if self.exists():
+            raise ValueError("Main password is already set")
+        params = self._generate_kdf_params(iterations, target_seconds, preset)
+        data_key = Fernet.generate_key()
+        main_crypto = params.create_crypto(password)
+        with self.db_handle._create_session() as session:
+            session.add_all([
+                Password(site=MAIN_PASSWORD_SITE, pw=main_crypto.encrypt_string(password), date=current_date_time()),
+                Password(site=DATA_KEY_SITE, pw=main_crypto.encrypt_string(data_key.decode()), date=current_date_time()),
+            ])
+            for row in kdf_meta_rows(params) + [verifier_meta_row(main_crypto)]:
+                session.merge(row)
+            session.commit()
+        main_crypto.lock(password)
+        return CryptoManager.from_key(data_key)
+
+    def unlock(self, password: str) -> CryptoManager:
+        """
+        Check main password and return CryptoManager of the data key
+
+        Args:
+            password (str): Main password
+
+        Raises:
+            WrongPasswordError: If password is not the main password
+            ValueError: If main password is not set
+
+        Returns:
+            CryptoManager: CryptoManager of the data key - use it for encrypting and decrypting passwords
+        """
+        return unlock_data_crypto(self.db_handle, password, self.kdf_params)
+
+    def verify(self, password: str) -> bool:
+        """
+        Returns True if password is the main password. Only the key derivation and verifier check are done,
+        data key is not decrypted.
+
+        Raises:
+            ValueError: If main password is not set
+        """
+        main_crypto = create_main_crypto(password, self.kdf_params)
+        try:
+            verify_main_crypto(self.db_handle, main_crypto)
+            return True
+        except WrongPasswordError:
+            # Key of a wrong password is not kept in the key cache, key of the main password is kept for unlock
+            main_crypto.lock(password)
+            return False
+
+    def change_password(self, old_password: str, new_password: str, iterations: Optional[int] = None,
+                        target_seconds: Optional[float] = None, preset: Optional[str] = None, **kwargs) -> None:
+        """
+        Change main password, new salt is generated. Only data key is encrypted again, passwords are not touched.
+        Vault without data key is re-keyed by rekey_vault (kwargs are passed to it).
+        Unfinished re-key is resumed instead - part of the passwords is already encrypted by its new data key,
+        so it has to use the same new password and its own KDF parameters.
+
+        Args:
+            old_password (str): Current main password
+            new_password (str): New main password
+        (Optional)
+            iterations (int): New PBKDF2 iterations. Defaults to the current key derivation.
+            target_seconds (float): Iterations are calibrated so the key derivation takes target_seconds
+                on this machine, ignored if iterations are given
+            preset (str): New key derivation preset from KDF_PRESETS
+
+        Raises:
+            WrongPasswordError: If old password is not the main password, or an unfinished re-key
+                uses a different new password
+        """
+        if self.has_unfinished_rekey():
+            from .rekey import rekey_vault
+            rekey_vault(self.db_handle, old_password, new_password, **kwargs)
+            return
+
+        params = self._generate_kdf_params(iterations, target_seconds, preset)
+        if not self.has_data_key():
+            from .rekey import rekey_vault
+            rekey_vault(self.db_handle, old_password, new_password, new_kdf_params=params, **kwargs)
+            return
+
+        data_crypto = self.unlock(old_password)
+        new_main_crypto = params.create_crypto(new_password)
+        wrapped_data_key = new_main_crypto.encrypt_string(data_crypto._key.decode())
+        with self.db_handle._create_session() as session:
+            session.execute(update(Password).where(Password.site == MAIN_PASSWORD_SITE)
+                            .values(pw=new_main_crypto.encrypt_string(new_password)))
+            session.execute(update(Password).where(Password.site == DATA_KEY_SITE).values(pw=wrapped_data_key))
+            for row in kdf_meta_rows(params) + [verifier_meta_row(new_main_crypto)]:
+                session.merge(row)
+            session.commit()
+        new_main_crypto.lock(new_password)
+
+    def _generate_kdf_params(self, iterations: Optional[int], target_seconds: Optional[float],
+                             preset: Optional[str] = None) -> KDFParams:
+        """
+        Returns KDF parameters with a new salt
+        """
+        if preset is not None:
+            return KDFParams.generate(preset=preset)
+        if iterations is None and target_seconds is not None:
+            iterations = calibrate_iterations(target_seconds)
+        if iterations is None:
+            current = self.kdf_params
+            return current.with_new_salt() if current else KDFParams.generate()
+        return KDFParams.generate(iterations)
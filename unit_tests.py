@@ -1,6 +1,16 @@
-import unittest, string, os
-from res.utils import DBHandler, PWGenerator, CryptoManager, WrongPasswordError
+import unittest, string, os, base64, io, subprocess, sys
+from res.utils import DBHandler, engine_registry, SiteIndex, PWGenerator, CryptoManager, WrongPasswordError, clear_key_cache
+from res.utils import rekey_vault, Vault, KDFParams, calibrate_iterations, available_presets
+from res.utils import export_vault, import_vault, import_entries, parse_file, iter_age_report, write_ndjson
+from res.utils import backfill_fingerprints
+from res.utils.hsh import _key_cache
+from res.utils import rekey
+from res.gui.gui import SiteListModel
+from res.gui import resources
+from res import cli
+from unittest import mock
 from tempfile import NamedTemporaryFile
+from sqlalchemy import create_engine, inspect, text
 
 class TestCryptoManager(unittest.TestCase):
     def setUp(self):
@@ -31,6 +41,79 @@ class TestCryptoManager(unittest.TestCase):
         with self.assertRaises(WrongPasswordError):
             wrong_crypto_manager.decrypt_string(encrypted_string)
 
+    def test_encrypt_many_decrypt_many(self):
+        strings = [f"password{i}" for i in range(1000)]
+        tokens = list(self.crypto_manager.encrypt_many(strings, chunk_size=64))
+        self.assertEqual(list(self.crypto_manager.decrypt_many(tokens)), strings)
+
+    def test_many_with_threads(self):
+        strings = [f"password{i}" for i in range(1000)]
+        tokens = list(self.crypto_manager.encrypt_many(iter(strings), workers=4, chunk_size=50))
+        self.assertEqual(list(self.crypto_manager.decrypt_many(tokens, workers=4, chunk_size=50)), strings)
+
+    def test_encrypt_many_accepts_bytes(self):
+        token, = self.crypto_manager.encrypt_many([b"bytes"])
+        self.assertEqual(self.crypto_manager.decrypt_string(token), "bytes")
+
+    def test_decrypt_many_wrong_password(self):
+        tokens = list(self.crypto_manager.encrypt_many(["a", "b"]))
+        wrong_crypto_manager = CryptoManager(password="wrong_password", salt=self.salt)
+        with self.assertRaises(WrongPasswordError):
+            list(wrong_crypto_manager.decrypt_many(tokens, workers=2))
+
+
+class TestKeyCache(unittest.TestCase):
+    def setUp(self):
+        clear_key_cache()
+
+    def tearDown(self):
+        clear_key_cache()
+
+    def test_key_is_derived_once(self):
+        with mock.patch.object(CryptoManager, "_generate_key_from_password",
+                               autospec=True, side_effect=lambda self, pw: base64.urlsafe_b64encode(b"k" * 32)) as derive:
+            CryptoManager("password")
+            CryptoManager("password")
+            CryptoManager("password", salt=b"other_salt")
+        self.assertEqual(derive.call_count, 2)
+
+    def test_cached_key_matches_derived_key(self):
+        first = CryptoManager("password")
+        second = CryptoManager("password")
+        self.assertEqual(first._key, second._key)
+        self.assertEqual(second.decrypt_string(first.encrypt_string("text")), "text")
+
+    def test_lock_evicts_and_zeroizes(self):
+        crypto_manager = CryptoManager("password")
+        buffer, _ = next(iter(_key_cache._keys.values()))
+        crypto_manager.lock("password")
+        self.assertEqual(len(_key_cache), 0)
+        self.assertEqual(buffer, bytearray(len(buffer)))
+
+    def test_vault_does_not_keep_keys(self):
+        db_handler = DBHandler(database_url=f'sqlite:///{NamedTemporaryFile(delete=False).name}')
+        vault = Vault(db_handler)
+        vault.create("main_password1!", iterations=1000)
+        self.assertEqual(len(_key_cache), 0)
+
+        for i in range(5):
+            self.assertFalse(vault.verify(f"wrong_password{i}"))
+            with self.assertRaises(WrongPasswordError):
+                vault.unlock(f"wrong_password{i}")
+        self.assertEqual(len(_key_cache), 0)
+
+        # Key of the verified main password is reused by unlock and evicted after the data key is unwrapped
+        self.assertTrue(vault.verify("main_password1!"))
+        self.assertEqual(len(_key_cache), 1)
+        vault.unlock("main_password1!")
+        self.assertEqual(len(_key_cache), 0)
+
+    def test_clear_key_cache(self):
+        CryptoManager("password")
+        CryptoManager("other_password")
+        clear_key_cache()
+        self.assertEqual(len(_key_cache), 0)
+
 
 class TestPWGenerator(unittest.TestCase):
     def test_default_password_length(self):
@@ -63,6 +146,77 @@ class TestPWGenerator(unittest.TestCase):
         password = pw_generator.get_random_password()
         self.assertTrue(string.punctuation in pw_generator._all_chars)
 
+    def test_generate_many(self):
+        pw_generator = PWGenerator(length=10)
+        passwords = pw_generator.generate_many(1000)
+        self.assertEqual(len(passwords), 1000)
+        self.assertTrue(all(len(password) == 10 for password in passwords))
+        self.assertTrue(all(c in pw_generator._all_chars for password in passwords for c in password))
+        self.assertGreater(len(set(passwords)), 990)
+
+    def test_generate_many_custom_length(self):
+        pw_generator = PWGenerator(digits=True, lower_case_letters=False, upper_case_letters=False, symbols=False)
+        passwords = pw_generator.generate_many(5, length=30)
+        self.assertEqual([len(password) for password in passwords], [30] * 5)
+        self.assertTrue(all(password.isdigit() for password in passwords))
+        self.assertEqual(pw_generator.generate_many(0), [])
+
+    def test_generate_many_uses_all_characters(self):
+        pw_generator = PWGenerator()
+        used_chars = set("".join(pw_generator.generate_many(1000, length=50)))
+        self.assertEqual(used_chars, set(pw_generator._all_chars))
+
+    def test_generate_many_without_characters(self):
+        pw_generator = PWGenerator(lower_case_letters=False, upper_case_letters=False, digits=False, symbols=False)
+        with self.assertRaises(ValueError):
+            pw_generator.generate_many(1)
+
+    def test_policy_min_counts(self):
+        pw_generator = PWGenerator(length=8, min_digits=3, min_symbols=2, min_upper_case_letters=1)
+        for password in pw_generator.generate_many(500):
+            self.assertEqual(len(password), 8)
+            self.assertGreaterEqual(sum(c.isdigit() for c in password), 3)
+            self.assertGreaterEqual(sum(c in string.punctuation for c in password), 2)
+            self.assertGreaterEqual(sum(c.isupper() for c in password), 1)
+
+    def test_policy_is_uniform(self):
+        # Passwords are digit + symbol or symbol + digit, both orders are equally likely
+        pw_generator = PWGenerator(length=2, lower_case_letters=False, upper_case_letters=False,
+                                   min_digits=1, min_symbols=1)
+        passwords = pw_generator.generate_many(2000)
+        digit_first = sum(password[0].isdigit() for password in passwords)
+        self.assertTrue(all(password[0].isdigit() != password[1].isdigit() for password in passwords))
+        self.assertTrue(800 < digit_first < 1200)
+
+    def test_exclude_ambiguous(self):
+        pw_generator = PWGenerator(length=50, exclude_ambiguous=True)
+        used_chars = set("".join(pw_generator.generate_many(200)))
+        self.assertFalse(used_chars & set(PWGenerator.AMBIGUOUS_CHARS))
+
+    def test_max_repeats(self):
+        pw_generator = PWGenerator(length=40, lower_case_letters=False, upper_case_letters=False,
+                                   symbols=False, max_repeats=1)
+        for password in pw_generator.generate_many(200):
+            self.assertTrue(all(a != b for a, b in zip(password, password[1:])))
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            PWGenerator(length=4, min_digits=3, min_symbols=2)
+        with self.assertRaises(ValueError):
+            PWGenerator(digits=False, min_digits=1)
+        with self.assertRaises(ValueError):
+            PWGenerator(max_repeats=0)
+
+    def test_max_repeats_with_one_character_group(self):
+        # Digit group is reduced to "9"
+        with mock.patch.object(PWGenerator, "AMBIGUOUS_CHARS", "012345678"):
+            with self.assertRaises(ValueError):
+                PWGenerator(length=6, digits=True, min_digits=3, max_repeats=2, exclude_ambiguous=True)
+            pw_generator = PWGenerator(length=6, lower_case_letters=False, upper_case_letters=False,
+                                       symbols=False, max_repeats=2, exclude_ambiguous=True)
+            with self.assertRaises(ValueError):
+                pw_generator.get_random_password()
+
 
 class TestDBHandler(unittest.TestCase):
     def setUp(self):
@@ -107,5 +261,950 @@ class TestDBHandler(unittest.TestCase):
         # Check if the retrieved site names match the original site names
         self.assertCountEqual(retrieved_sites, sites)
 
+    def test_save_passwords(self):
+        rows = [(f"Site{i}", f"pw{i}".encode(), None) for i in range(25)]
+
+        # Save passwords in several batches
+        saved = self.db_handler.save_passwords(iter(rows), batch_size=10)
+
+        self.assertEqual(saved, 25)
+        self.assertCountEqual(self.db_handler.get_all_sites(), [row[0] for row in rows])
+        self.assertEqual(self.db_handler.get_password("Site24"), b"pw24")
+
+    def test_get_sites_pagination(self):
+        self.db_handler._save_reserved_password("MAINPW", b"main")
+        self.db_handler.save_passwords((f"Site{i}", b"pw", "01.01.2024-00:00:00") for i in range(5))
+
+        first_page = self.db_handler.get_sites(limit=2)
+        next_page = self.db_handler.get_sites(limit=2, after_id=first_page[-1].id)
+        offset_page = self.db_handler.get_sites(limit=2, offset=2)
+
+        self.assertEqual([entry.site for entry in first_page], ["Site0", "Site1"])
+        self.assertEqual([entry.site for entry in next_page], ["Site2", "Site3"])
+        self.assertEqual(offset_page, next_page)
+        self.assertEqual(first_page[0].date, "01.01.2024-00:00:00")
+
+    def test_iter_sites(self):
+        self.db_handler._save_reserved_password("MAINPW", b"main")
+        self.db_handler.save_passwords((f"Site{i}", b"pw", None) for i in range(7))
+
+        sites = [entry.site for entry in self.db_handler.iter_sites(batch_size=3)]
+
+        self.assertEqual(sites, [f"Site{i}" for i in range(7)])
+
+    def test_engine_is_shared(self):
+        other_handler = DBHandler(database_url=self.db_url)
+        stats = engine_registry.stats(self.db_url)
+
+        self.assertIs(other_handler._engine, self.db_handler._engine)
+        self.assertEqual(stats.engine_creations, 1)
+
+    def test_checkouts_are_counted(self):
+        stats = engine_registry.stats(self.db_url)
+        checkouts = stats.checkouts
+
+        self.db_handler.save_password("Site", b"pw")
+        self.db_handler.get_password("Site")
+
+        self.assertEqual(stats.checkouts, checkouts + 2)
+
+    def test_sqlite_profiles(self):
+        def pragmas(db_handler):
+            with db_handler._engine.connect() as connection:
+                return (connection.execute(text("PRAGMA journal_mode")).scalar(),
+                        connection.execute(text("PRAGMA synchronous")).scalar())
+
+        default_file = NamedTemporaryFile(delete=False)
+        default_handler = DBHandler(database_url=f'sqlite:///{default_file.name}', profile="default")
+
+        performance_handler = DBHandler(database_url=self.db_url, profile="performance")
+
+        # Every commit is synced by default
+        self.assertEqual(pragmas(self.db_handler), ("wal", 2))
+        self.assertEqual(pragmas(performance_handler), ("wal", 1))
+        self.assertEqual(pragmas(default_handler), ("delete", 2))
+        self.assertIsNot(performance_handler._engine, self.db_handler._engine)
+        with self.assertRaises(ValueError):
+            DBHandler(database_url=self.db_url, profile="fastest")
+
+    def test_site_index_exists(self):
+        indexes = inspect(self.db_handler._engine).get_indexes("pwdata")
+        self.assertIn("ux_pwdata_site", [index["name"] for index in indexes])
+
+    def test_migration_creates_site_index(self):
+        # Database created before the index was introduced
+        legacy_file = NamedTemporaryFile(delete=False)
+        legacy_url = f'sqlite:///{legacy_file.name}'
+        with create_engine(legacy_url).begin() as connection:
+            connection.execute(text("CREATE TABLE pwdata (id INTEGER PRIMARY KEY, site VARCHAR, date VARCHAR, pw BLOB)"))
+            connection.execute(text("INSERT INTO pwdata (site, date, pw) VALUES ('Legacy', '01.01.2024-00:00:00', x'00')"))
+            connection.execute(text("CREATE INDEX ix_pwdata_site_date ON pwdata (site, date)"))
+
+        db_handler = DBHandler(database_url=legacy_url)
+
+        # Redundant (site, date) index of older schema is dropped
+        index_names = [index["name"] for index in inspect(db_handler._engine).get_indexes("pwdata")]
+        self.assertIn("ux_pwdata_site", index_names)
+        self.assertNotIn("ix_pwdata_site_date", index_names)
+        self.assertEqual(db_handler.get_password("Legacy"), b"\x00")
+
+    def test_migration_adds_missing_columns(self):
+        legacy_file = NamedTemporaryFile(delete=False)
+        legacy_url = f'sqlite:///{legacy_file.name}'
+        with create_engine(legacy_url).begin() as connection:
+            connection.execute(text("CREATE TABLE rekey_state (id INTEGER PRIMARY KEY, last_id INTEGER, new_main_pw BLOB)"))
+
+        db_handler = DBHandler(database_url=legacy_url)
+
+        columns = inspect(db_handler._engine).get_columns("rekey_state")
+        self.assertIn("new_data_key", [column["name"] for column in columns])
+
+    def test_save_keeps_history(self):
+        self.db_handler.save_password("Site", b"pw1", "01.01.2024-00:00:00")
+        site_id = self.db_handler.get_sites()[0].id
+        self.db_handler.save_password("Site", b"pw2", "02.01.2024-00:00:00")
+        self.db_handler.save_password("Site", b"pw3", "03.01.2024-00:00:00")
+
+        self.assertEqual(self.db_handler.get_password("Site"), b"pw3")
+        self.assertEqual([entry[:3] for entry in self.db_handler.get_sites()], [(site_id, "Site", "03.01.2024-00:00:00")])
+        history = self.db_handler.get_history("Site")
+        self.assertEqual([(row.pw, row.date) for row in history],
+                         [(b"pw2", "02.01.2024-00:00:00"), (b"pw1", "01.01.2024-00:00:00")])
+        self.assertEqual(self.db_handler.get_history("Site", limit=1, before_id=history[0].id), history[1:])
+        self.assertEqual([row.pw for row in self.db_handler.iter_history("Site", batch_size=1)], [b"pw2", b"pw1"])
+        self.assertEqual(self.db_handler.get_history("Other"), [])
+
+    def test_save_passwords_keeps_history(self):
+        self.db_handler.save_password("Site1", b"pw0")
+        rows = [("Site1", b"pw1", None), ("Site2", b"pw1", None), ("Site1", b"pw2", None), ("Site1", b"pw3", None)]
+
+        self.db_handler.save_passwords(rows, batch_size=3)
+
+        self.assertEqual(self.db_handler.get_all_sites(), ["Site1", "Site2"])
+        self.assertEqual(self.db_handler.get_password("Site1"), b"pw3")
+        self.assertEqual([row.pw for row in self.db_handler.iter_history("Site1")], [b"pw2", b"pw1", b"pw0"])
+        self.assertEqual(list(self.db_handler.iter_history("Site2")), [])
+
+    def test_migration_moves_duplicates_to_history(self):
+        legacy_file = NamedTemporaryFile(delete=False)
+        legacy_url = f'sqlite:///{legacy_file.name}'
+        with create_engine(legacy_url).begin() as connection:
+            connection.execute(text("CREATE TABLE pwdata (id INTEGER PRIMARY KEY, site VARCHAR, date VARCHAR, pw BLOB)"))
+            connection.execute(text("INSERT INTO pwdata (site, date, pw) VALUES ('Site', 'd1', x'01'), ('Other', 'd1', x'00'), "
+                                    "('Site', 'd2', x'02'), ('Site', 'd3', x'03')"))
+
+        db_handler = DBHandler(database_url=legacy_url)
+
+        self.assertEqual(db_handler.get_all_sites(), ["Other", "Site"])
+        self.assertEqual(db_handler.get_password("Site"), b"\x03")
+        self.assertEqual([(row.date, row.pw) for row in db_handler.get_history("Site")], [("d2", b"\x02"), ("d1", b"\x01")])
+        indexes = inspect(db_handler._engine).get_indexes("pwdata")
+        self.assertIn("ux_pwdata_site", [index["name"] for index in indexes])
+
+    def test_timestamps(self):
+        from res.utils.db import date_to_timestamp
+        self.db_handler.save_password("Old", b"pw", "01.01.2024-00:00:00")
+        with mock.patch("res.utils.db.time.time", return_value=1800000000.5):
+            self.db_handler.save_password("New", b"pw")
+
+        old, new = self.db_handler.get_sites()
+        self.assertEqual(old.timestamp, date_to_timestamp("01.01.2024-00:00:00"))
+        # Date is evaluated on every call, not once at import time
+        self.assertEqual(new.timestamp, 1800000000)
+        self.assertEqual(date_to_timestamp(new.date), 1800000000)
+        with self.assertRaises(ValueError):
+            date_to_timestamp("2024-01-01")
+
+    def test_changed_range_queries(self):
+        self.db_handler._save_reserved_password("MAINPW", b"main", "01.01.2024-00:00:00")
+        self.db_handler.save_passwords((f"Site{i}", b"pw", f"{i + 1:02}.01.2024-00:00:00") for i in range(6))
+        self.db_handler.save_password("Late", b"pw", "03.01.2024-00:00:00")
+        day = 24 * 60 * 60
+        since = self.db_handler.get_sites()[2].timestamp
+
+        changed = [entry.site for entry in self.db_handler.iter_changed(since=since, batch_size=2)]
+        self.assertEqual(changed, ["Site2", "Late", "Site3", "Site4", "Site5"])
+        changed = [entry.site for entry in self.db_handler.get_changed(since=since, until=since + day)]
+        self.assertEqual(changed, ["Site2", "Late"])
+        self.assertEqual(self.db_handler.get_changed(limit=1)[0].site, "Site0")
+
+    def test_migration_fills_timestamps(self):
+        from res.utils.db import date_to_timestamp
+        legacy_file = NamedTemporaryFile(delete=False)
+        legacy_url = f'sqlite:///{legacy_file.name}'
+        with create_engine(legacy_url).begin() as connection:
+            connection.execute(text("CREATE TABLE pwdata (id INTEGER PRIMARY KEY, site VARCHAR, date VARCHAR, pw BLOB)"))
+            connection.execute(text("INSERT INTO pwdata (site, date, pw) VALUES ('Site', '24.12.2023-18:30:15', x'00'), "
+                                    "('Unknown', 'yesterday', x'00')"))
+
+        db_handler = DBHandler(database_url=legacy_url)
+
+        self.assertEqual([entry.timestamp for entry in db_handler.get_sites()],
+                         [date_to_timestamp("24.12.2023-18:30:15"), None])
+        self.assertEqual([entry.site for entry in db_handler.iter_changed()], ["Site"])
+
+    def test_date_in_other_format_has_no_timestamp(self):
+        self.db_handler.save_passwords([("Site", b"pw", "24.12.2023-18:30:15"), ("Unknown", b"pw", "yesterday")])
+        self.assertEqual([entry.timestamp is None for entry in self.db_handler.get_sites()], [False, True])
+        self.assertEqual(self.db_handler.get_sites()[1].date, "yesterday")
+
+    def test_reserved_sites_are_rejected(self):
+        data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+        for site in ("MAINKEY", "MAINPW"):
+            with self.assertRaises(ValueError):
+                self.db_handler.save_password(site, data_crypto.encrypt_string("x"))
+            with self.assertRaises(ValueError):
+                self.db_handler.save_passwords([("Site", b"pw", None), (site, b"pw", None)])
+        with self.assertRaises(ValueError):
+            self.db_handler._save_reserved_password("Site", b"pw")
+
+        self.assertEqual(Vault(self.db_handler).unlock("main_password1!")._key, data_crypto._key)
+
+    def test_save_passwords_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            self.db_handler.save_passwords([], batch_size=0)
+
+class TestSiteIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SiteIndex(["GitHub", "Gmail", "mail.example.com", "Hotmail", "git", "MAINPW"])
+
+    def test_ranking(self):
+        self.assertEqual(self.index.search("git"), ["git", "GitHub"])
+        self.assertEqual(self.index.search("mail"), ["mail.example.com", "Gmail", "Hotmail"])
+
+    def test_short_query_uses_prefix(self):
+        self.assertEqual(self.index.search("g"), ["git", "GitHub", "Gmail"])
+
+    def test_limit_and_empty_query(self):
+        self.assertEqual(self.index.search("mail", limit=1), ["mail.example.com"])
+        self.assertEqual(self.index.search(""), [])
+        self.assertEqual(self.index.search("xyz"), [])
+
+    def test_reserved_sites_are_not_indexed(self):
+        self.assertNotIn("MAINPW", self.index)
+        self.assertEqual(len(self.index), 5)
+
+    def test_attach_updates_index_on_save(self):
+        db_file = NamedTemporaryFile(delete=False)
+        db_handler = DBHandler(database_url=f'sqlite:///{db_file.name}')
+        db_handler.save_password("Existing", b"pw")
+        index = SiteIndex().attach(db_handler)
+
+        db_handler.save_password("NewSite", b"pw")
+        db_handler.save_passwords([("BulkSite", b"pw", None)])
+
+        self.assertEqual(index.search("site"), ["NewSite", "BulkSite"])
+        self.assertIn("Existing", index)
+
+
+class TestRekeyVault(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.old_crypto = CryptoManager("old_password1!")
+        self.db_handler._save_reserved_password("MAINPW", self.old_crypto.encrypt_string("old_password1!"))
+        self.passwords = {f"Site{i}": f"password{i}" for i in range(10)}
+        self.db_handler.save_passwords((site, self.old_crypto.encrypt_string(pw), None) for site, pw in self.passwords.items())
+
+    def assert_rekeyed(self):
+        # Unlock checks MAINPW
+        data_crypto = Vault(self.db_handler).unlock("new_password2!")
+        for site, pw in self.passwords.items():
+            self.assertEqual(data_crypto.decrypt_string(self.db_handler.get_password(site)), pw)
+
+    def test_rekey(self):
+        stats = rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=3, workers=0)
+        self.assertEqual(stats.rows, 10)
+        self.assertFalse(stats.resumed)
+        self.assert_rekeyed()
+
+    def test_rekey_history(self):
+        self.db_handler.save_password("Site0", self.old_crypto.encrypt_string("old_password0"))
+        self.db_handler.save_password("Site0", self.old_crypto.encrypt_string(self.passwords["Site0"]))
+
+        stats = rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=3, workers=0)
+
+        self.assertEqual(stats.rows, 12)
+        self.assert_rekeyed()
+        data_crypto = Vault(self.db_handler).unlock("new_password2!")
+        self.assertEqual([data_crypto.decrypt_string(row.pw) for row in self.db_handler.iter_history("Site0")],
+                         ["old_password0", "password0"])
+
+    def test_rekey_with_processes(self):
+        rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=4, workers=2)
+        self.assert_rekeyed()
+
+    def test_wrong_old_password(self):
+        with self.assertRaises(WrongPasswordError):
+            rekey_vault(self.db_handler, "wrong_password", "new_password2!", workers=0)
+
+    def test_resume_after_crash(self):
+        original_rekey_chunk = rekey._rekey_chunk
+        calls = []
+
+        def crash_on_second_chunk(chunk):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise RuntimeError("Crash")
+            return original_rekey_chunk(chunk)
+
+        with mock.patch.object(rekey, "_rekey_chunk", side_effect=crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=3, workers=0)
+
+        # Old password is still the main password, different new password is refused
+        self.assertEqual(self.old_crypto.decrypt_string(self.db_handler.get_password("MAINPW")), "old_password1!")
+        with self.assertRaises(WrongPasswordError):
+            rekey_vault(self.db_handler, "old_password1!", "other_password3!", workers=0)
+
+        stats = rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=3, workers=0)
+        self.assertTrue(stats.resumed)
+        self.assertEqual(stats.rows, 7)
+        self.assert_rekeyed()
+
+    def test_change_password_resumes_unfinished_rekey(self):
+        with mock.patch.object(rekey, "_rekey_chunk", side_effect=RuntimeError("Crash")):
+            with self.assertRaises(RuntimeError):
+                rekey_vault(self.db_handler, "old_password1!", "new_password2!", chunk_size=3, workers=0)
+        vault = Vault(self.db_handler)
+        self.assertTrue(vault.has_unfinished_rekey())
+
+        with self.assertRaises(WrongPasswordError):
+            vault.change_password("old_password1!", "other_password3!", workers=0)
+        vault.change_password("old_password1!", "new_password2!", workers=0)
+
+        self.assertFalse(vault.has_unfinished_rekey())
+        self.assert_rekeyed()
+        self.assertEqual(vault.kdf_params, KDFParams.from_dict(self.db_handler.get_meta()))
+
+    def test_rekey_rotates_data_key(self):
+        rekey_vault(self.db_handler, "old_password1!", "new_password2!", workers=0)
+        data_key = Vault(self.db_handler).unlock("new_password2!")._key
+
+        rekey_vault(self.db_handler, "new_password2!", "new_password2!", workers=0)
+
+        self.assertNotEqual(Vault(self.db_handler).unlock("new_password2!")._key, data_key)
+        self.assert_rekeyed()
+
+
+class TestVault(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.vault = Vault(self.db_handler)
+
+    def test_create_and_unlock(self):
+        self.assertFalse(self.vault.exists())
+        data_crypto = self.vault.create("main_password1!")
+        self.db_handler.save_password("Site", data_crypto.encrypt_string("secret"))
+
+        self.assertTrue(self.vault.exists())
+        self.assertTrue(self.vault.has_data_key())
+        unlocked = self.vault.unlock("main_password1!")
+        self.assertEqual(unlocked.decrypt_string(self.db_handler.get_password("Site")), "secret")
+        self.assertEqual(self.db_handler.get_all_sites(), ["Site"])
+
+    def test_create_twice(self):
+        self.vault.create("main_password1!")
+        with self.assertRaises(ValueError):
+            self.vault.create("main_password1!")
+
+    def test_unlock_wrong_password(self):
+        self.vault.create("main_password1!")
+        with self.assertRaises(WrongPasswordError):
+            self.vault.unlock("wrong_password")
+
+    def test_change_password_does_not_touch_passwords(self):
+        data_crypto = self.vault.create("main_password1!")
+        self.db_handler.save_password("Site", data_crypto.encrypt_string("secret"))
+        encrypted = self.db_handler.get_password("Site")
+
+        self.vault.change_password("main_password1!", "main_password2!")
+
+        self.assertEqual(self.db_handler.get_password("Site"), encrypted)
+        with self.assertRaises(WrongPasswordError):
+            self.vault.unlock("main_password1!")
+        self.assertEqual(self.vault.unlock("main_password2!").decrypt_string(encrypted), "secret")
+
+    def test_change_password_upgrades_vault_without_data_key(self):
+        main_crypto = CryptoManager("main_password1!")
+        self.db_handler._save_reserved_password("MAINPW", main_crypto.encrypt_string("main_password1!"))
+        self.db_handler.save_password("Site", main_crypto.encrypt_string("secret"))
+        self.assertFalse(self.vault.has_data_key())
+        self.assertEqual(self.vault.unlock("main_password1!").decrypt_string(self.db_handler.get_password("Site")), "secret")
+
+        self.vault.change_password("main_password1!", "main_password2!", workers=0)
+
+        self.assertTrue(self.vault.has_data_key())
+        self.assertEqual(self.vault.unlock("main_password2!").decrypt_string(self.db_handler.get_password("Site")), "secret")
+
+    def test_kdf_params_are_saved(self):
+        self.vault.create("main_password1!", iterations=123000)
+        other_db_file = NamedTemporaryFile(delete=False)
+        other_vault = Vault(DBHandler(database_url=f'sqlite:///{other_db_file.name}'))
+        other_vault.create("main_password1!", iterations=123000)
+
+        params = self.vault.kdf_params
+        self.assertEqual(params.iterations, 123000)
+        self.assertEqual(params.algorithm, "pbkdf2-sha256")
+        self.assertEqual(len(params.salt), 16)
+        self.assertNotEqual(params.salt, other_vault.kdf_params.salt)
+        self.assertEqual(self.db_handler.get_meta()["iterations"], "123000")
+
+    def test_change_password_changes_salt(self):
+        self.vault.create("main_password1!", iterations=110000)
+        old_params = self.vault.kdf_params
+
+        self.vault.change_password("main_password1!", "main_password2!")
+
+        self.assertNotEqual(self.vault.kdf_params.salt, old_params.salt)
+        self.assertEqual(self.vault.kdf_params.iterations, 110000)
+        self.vault.unlock("main_password2!")
+
+    def test_create_with_calibration(self):
+        with mock.patch("res.utils.vault.calibrate_iterations", return_value=321000) as calibrate:
+            self.vault.create("main_password1!", target_seconds=0.5)
+        calibrate.assert_called_once_with(0.5)
+        self.assertEqual(self.vault.kdf_params.iterations, 321000)
+
+    def test_create_with_preset(self):
+        self.vault.create("main_password1!", preset="scrypt-interactive")
+
+        params = self.vault.kdf_params
+        self.assertEqual(params.algorithm, "scrypt")
+        self.assertEqual(params.cost, {"n": 2 ** 14, "r": 8, "p": 1})
+        self.assertEqual(self.db_handler.get_meta()["n"], str(2 ** 14))
+        clear_key_cache()
+        self.vault.unlock("main_password1!")
+        with self.assertRaises(WrongPasswordError):
+            self.vault.unlock("main_password2!")
+
+    def test_change_password_keeps_preset(self):
+        self.vault.create("main_password1!", preset="scrypt-interactive")
+
+        self.vault.change_password("main_password1!", "main_password2!")
+        self.assertEqual(self.vault.kdf_params.algorithm, "scrypt")
+
+        self.vault.change_password("main_password2!", "main_password3!", iterations=120000)
+        self.assertEqual(self.vault.kdf_params.algorithm, "pbkdf2-sha256")
+        self.assertEqual(self.vault.kdf_params.iterations, 120000)
+        self.vault.unlock("main_password3!")
+
+    def test_verifier(self):
+        self.vault.create("main_password1!")
+        verifier = self.db_handler.get_meta()["verifier"]
+
+        self.assertTrue(self.vault.verify("main_password1!"))
+        with mock.patch.object(CryptoManager, "decrypt_string") as decrypt:
+            self.assertFalse(self.vault.verify("main_password2!"))
+            with self.assertRaises(WrongPasswordError):
+                self.vault.unlock("main_password2!")
+        decrypt.assert_not_called()
+
+        self.vault.change_password("main_password1!", "main_password2!")
+        self.assertNotEqual(self.db_handler.get_meta()["verifier"], verifier)
+        self.assertFalse(self.vault.verify("main_password1!"))
+        self.assertTrue(self.vault.verify("main_password2!"))
+
+    def test_verifier_is_added_to_old_vault(self):
+        main_crypto = CryptoManager("main_password1!")
+        self.db_handler._save_reserved_password("MAINPW", main_crypto.encrypt_string("main_password1!"))
+
+        self.assertFalse(self.vault.verify("main_password2!"))
+        self.assertNotIn("verifier", self.db_handler.get_meta())
+        self.assertTrue(self.vault.verify("main_password1!"))
+        self.assertEqual(self.db_handler.get_meta()["verifier"], main_crypto.verifier().hex())
+
+    def test_vault_without_kdf_params(self):
+        main_crypto = CryptoManager("main_password1!")
+        self.db_handler._save_reserved_password("MAINPW", main_crypto.encrypt_string("main_password1!"))
+        self.assertIsNone(self.vault.kdf_params)
+        self.vault.unlock("main_password1!")
+
+
+class TestKDFParams(unittest.TestCase):
+    def test_dict_round_trip(self):
+        params = KDFParams.generate(150000)
+        self.assertEqual(KDFParams.from_dict(params.to_dict()), params)
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            KDFParams.from_dict({"kdf": "md5", "salt": "00", "iterations": "1"})
+        with self.assertRaises(ValueError):
+            KDFParams.generate(preset="md5")
+
+    def test_preset_dict_round_trip(self):
+        for preset in available_presets():
+            params = KDFParams.generate(preset=preset)
+            # Other metadata are ignored
+            self.assertEqual(KDFParams.from_dict({**params.to_dict(), "other": "1"}), params)
+
+    def test_subkeys(self):
+        crypto = CryptoManager("main_password1!", iterations=1000)
+        self.assertNotEqual(crypto.derive_subkey(b"a"), crypto.derive_subkey(b"b"))
+        self.assertEqual(len(crypto.derive_subkey(b"a")), 32)
+        self.assertTrue(crypto.verify(crypto.verifier()))
+        self.assertFalse(crypto.verify(CryptoManager("main_password2!", iterations=1000).verifier()))
+
+    def test_kdfs_derive_different_keys(self):
+        salt = os.urandom(16)
+        scrypt = CryptoManager("main_password1!", salt=salt, kdf="scrypt", kdf_cost={"n": 2 ** 10, "r": 8, "p": 1})
+        pbkdf2 = CryptoManager("main_password1!", salt=salt, iterations=1000)
+        self.assertNotEqual(scrypt._key, pbkdf2._key)
+        self.assertEqual(scrypt.decrypt_string(scrypt.encrypt_string("secret")), "secret")
+        with self.assertRaises(ValueError):
+            CryptoManager("main_password1!", kdf="md5")
+
+    @unittest.skipUnless("argon2id" in available_presets(), "Argon2id is not supported")
+    def test_argon2id(self):
+        params = KDFParams(os.urandom(16), {"iterations": 1, "memory_cost": 1024, "lanes": 1}, "argon2id")
+        crypto = params.create_crypto("main_password1!")
+        clear_key_cache()
+        self.assertEqual(params.create_crypto("main_password1!")._key, crypto._key)
+        self.assertNotEqual(params.with_new_salt().create_crypto("main_password1!")._key, crypto._key)
+
+    def test_calibrate_iterations(self):
+        self.assertEqual(calibrate_iterations(0.000001, minimum=5000), 5000)
+        self.assertGreater(calibrate_iterations(1.0, minimum=1000), calibrate_iterations(0.01, minimum=1000))
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+        self.db_handler.save_passwords((f"Site{i}", pw, None) for i, pw in
+                                       enumerate(self.data_crypto.encrypt_many(f"secret{i}" for i in range(25))))
+        self.archive_file = NamedTemporaryFile(delete=False)
+        self.archive_file.close()
+        self.params = KDFParams.generate(1000)
+
+    def test_round_trip_date_in_other_format(self):
+        # Migrated rows keep dates that are not in DATE_FORMAT
+        with self.db_handler._engine.begin() as connection:
+            connection.execute(text("UPDATE pwdata SET date = 'yesterday', timestamp = NULL WHERE site = 'Site3'"))
+        export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!", kdf_params=self.params)
+
+        other_db, other_crypto, stats = self._import()
+
+        self.assertEqual(stats.rows, 25)
+        self.assertEqual([(entry.date, entry.timestamp) for entry in other_db.get_sites() if entry.site == "Site3"],
+                         [("yesterday", None)])
+
+    def test_import_refuses_reserved_sites(self):
+        from res.utils import archive
+        with mock.patch.object(archive, "read_archive", return_value=iter([[("MAINKEY", "01.01.2024-00:00:00", "x")]])):
+            with self.assertRaises(ValueError):
+                import_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!")
+        self.assertEqual(Vault(self.db_handler).unlock("main_password1!")._key, self.data_crypto._key)
+
+    def _import(self, archive_password="archive1!"):
+        other_db = DBHandler(database_url=f'sqlite:///{NamedTemporaryFile(delete=False).name}')
+        other_crypto = Vault(other_db).create("main_password2!", iterations=1000)
+        stats = import_vault(other_db, other_crypto, self.archive_file.name, archive_password, batch_size=7)
+        return other_db, other_crypto, stats
+
+    def test_round_trip(self):
+        stats = export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!",
+                             chunk_rows=10, kdf_params=self.params)
+        self.assertEqual(stats.rows, 25)
+        self.assertEqual(stats.bytes, os.path.getsize(self.archive_file.name))
+
+        other_db, other_crypto, stats = self._import()
+        self.assertEqual(stats.rows, 25)
+        self.assertEqual(other_db.get_all_sites(), [f"Site{i}" for i in range(25)])
+        self.assertEqual(other_crypto.decrypt_string(other_db.get_password("Site24")), "secret24")
+
+    def test_history_round_trip(self):
+        self.db_handler.save_password("Site1", self.data_crypto.encrypt_string("secret1b"))
+        export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!", kdf_params=self.params)
+
+        other_db, other_crypto, stats = self._import()
+        self.assertEqual(stats.rows, 26)
+        self.assertEqual(other_crypto.decrypt_string(other_db.get_password("Site1")), "secret1b")
+        self.assertEqual([other_crypto.decrypt_string(row.pw) for row in other_db.iter_history("Site1")], ["secret1"])
+
+    def test_empty_vault(self):
+        empty_db = DBHandler(database_url=f'sqlite:///{NamedTemporaryFile(delete=False).name}')
+        export_vault(empty_db, self.data_crypto, self.archive_file.name, "archive1!", kdf_params=self.params)
+        self.assertEqual(self._import()[2].rows, 0)
+
+    def test_length_over_limit(self):
+        from res.utils.archive import MAGIC
+        export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!", kdf_params=self.params)
+        with open(self.archive_file.name, "rb") as file:
+            data = file.read()
+        header_length = int.from_bytes(data[len(MAGIC):len(MAGIC) + 4], "big")
+        chunk_offset = len(MAGIC) + 4 + header_length
+        corrupted_files = (
+            data[:len(MAGIC)] + b"\xff" * 4 + data[len(MAGIC) + 4:],
+            data[:chunk_offset] + b"\xff" * 4 + data[chunk_offset + 4:],
+        )
+        for corrupted in corrupted_files:
+            with open(self.archive_file.name, "wb") as file:
+                file.write(corrupted)
+            with self.assertRaisesRegex(ValueError, "over the limit"):
+                self._import()
+
+    def test_wrong_password(self):
+        export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!", kdf_params=self.params)
+        with self.assertRaises(WrongPasswordError):
+            self._import("archive2!")
+
+    def test_modified_archive(self):
+        export_vault(self.db_handler, self.data_crypto, self.archive_file.name, "archive1!",
+                     chunk_rows=10, kdf_params=self.params)
+        with open(self.archive_file.name, "rb") as file:
+            data = file.read()
+
+        # Find start of the last chunk
+        position = 8 + 4 + int.from_bytes(data[8:12], "big")
+        while data[position + 4] == 0:
+            position += 5 + int.from_bytes(data[position:position + 4], "big")
+        last_chunk = position
+        # Changed byte, missing last chunk and appended data
+        for modified in (data[:-1] + bytes([data[-1] ^ 1]), data[:last_chunk], data + b"x"):
+            with open(self.archive_file.name, "wb") as file:
+                file.write(modified)
+            with self.assertRaises(ValueError):
+                self._import()
+
+
+class TestImporter(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+
+    def _write(self, suffix, content):
+        file = NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8")
+        file.write(content)
+        file.close()
+        return file.name
+
+    def test_csv(self):
+        path = self._write(".csv", "name,url,username,password,note\n"
+                                   "Site1,https://site1,user,secret1,\n"
+                                   "Site2,https://site2,user,\"se,cret2\",\"multi\nline\"\n"
+                                   "Site3,https://site3,user,,\n")
+        self.assertEqual(list(parse_file(path)), [("Site1", "secret1"), ("Site2", "se,cret2"), ("Site3", "")])
+
+    def test_csv_without_password_column(self):
+        path = self._write(".csv", "name,url\nSite1,https://site1\n")
+        with self.assertRaises(ValueError):
+            list(parse_file(path))
+
+    def test_bitwarden_json(self):
+        path = self._write(".json", '{"items": [{"name": "Site1", "login": {"username": "u", "password": "secret1"}},'
+                                    ' {"name": "Note", "type": 2}]}')
+        self.assertEqual(list(parse_file(path)), [("Site1", "secret1"), ("Note", None)])
+
+    def test_json_lines(self):
+        path = self._write(".txt", '{"title": "Site1", "Password": "secret1"}\n\n')
+        self.assertEqual(list(parse_file(path, "jsonl")), [("Site1", "secret1")])
+        with self.assertRaises(ValueError):
+            parse_file(path)
+
+    def test_import_entries(self):
+        entries = [(f"Site{i}", f"secret{i}") for i in range(10)] + [("Site", ""), (None, "secret")]
+        stats = import_entries(self.db_handler, self.data_crypto, iter(entries), batch_size=3, workers=0)
+
+        self.assertEqual((stats.rows, stats.skipped), (10, 2))
+        self.assertEqual(self.db_handler.get_all_sites(), [f"Site{i}" for i in range(10)])
+        self.assertEqual(self.data_crypto.decrypt_string(self.db_handler.get_password("Site9")), "secret9")
+
+    def test_import_skips_reserved_sites(self):
+        stats = import_entries(self.db_handler, self.data_crypto, [("MAINKEY", "x"), ("MAINPW", "y"), ("Site1", "secret1")],
+                               workers=0)
+        self.assertEqual((stats.rows, stats.skipped), (1, 2))
+        self.assertEqual(Vault(self.db_handler).unlock("main_password1!")._key, self.data_crypto._key)
+
+    def test_import_entries_in_processes(self):
+        stats = import_entries(self.db_handler, self.data_crypto, [("Site1", "secret1"), ("Site2", "secret2")],
+                               batch_size=1, workers=2)
+        self.assertEqual(stats.rows, 2)
+        self.assertEqual(self.data_crypto.decrypt_string(self.db_handler.get_password("Site2")), "secret2")
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        from res.utils.db import date_to_timestamp
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.db_handler._save_reserved_password("MAINPW", b"main", "01.01.2020-00:00:00")
+        self.db_handler.save_passwords([("New", b"pw", "30.12.2023-00:00:00"), ("Old", b"pw", "01.01.2023-00:00:00"),
+                                        ("Middle", b"pw", "01.06.2023-00:00:00")])
+        self.now = date_to_timestamp("31.12.2023-00:00:00")
+
+    def test_oldest_first(self):
+        entries = list(iter_age_report(self.db_handler, now=self.now, batch_size=1))
+        self.assertEqual([(entry.site, entry.age_days) for entry in entries], [("Old", 364), ("Middle", 213), ("New", 1)])
+
+    def test_older_than(self):
+        entries = iter_age_report(self.db_handler, older_than_days=200, now=self.now)
+        self.assertEqual([entry.site for entry in entries], ["Old", "Middle"])
+        self.assertEqual(list(iter_age_report(self.db_handler, older_than_days=365, now=self.now)), [])
+
+    def test_ndjson(self):
+        import json
+        self.db_handler.save_password('Quote "site" ž', b"pw", "31.01.2023-00:00:00")
+        output = io.StringIO()
+        count = write_ndjson(iter_age_report(self.db_handler, now=self.now), output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(count, len(lines))
+        self.assertEqual([json.loads(line) for line in lines],
+                         [entry._asdict() for entry in iter_age_report(self.db_handler, now=self.now)])
+        self.assertEqual(json.loads(lines[1])["site"], 'Quote "site" ž')
+
+
+class TestFingerprints(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_url = f'sqlite:///{self.db_file.name}'
+        self.db_handler = DBHandler(database_url=self.db_url)
+        self.data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+        self.passwords = {"Site0": "shared", "Site1": "unique", "Site2": "shared", "Site3": "other", "Site4": "other",
+                          "Site5": "shared"}
+
+    def _save(self, fingerprints=True):
+        self.db_handler.save_passwords((site, self.data_crypto.encrypt_string(pw), None,
+                                        self.data_crypto.fingerprint(pw) if fingerprints else None)
+                                       for site, pw in self.passwords.items())
+
+    def test_fingerprint_is_keyed(self):
+        other_crypto = CryptoManager.from_key(base64.urlsafe_b64encode(os.urandom(32)))
+        self.assertEqual(self.data_crypto.fingerprint("secret"), self.data_crypto.fingerprint(b"secret"))
+        self.assertEqual(CryptoManager.from_key(self.data_crypto._key).fingerprint("secret"),
+                         self.data_crypto.fingerprint("secret"))
+        self.assertNotEqual(self.data_crypto.fingerprint("secret"), self.data_crypto.fingerprint("secret2"))
+        self.assertNotEqual(other_crypto.fingerprint("secret"), self.data_crypto.fingerprint("secret"))
+
+    def test_get_reused(self):
+        self._save()
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site3", "Site4"]])
+
+        # Changed password leaves the group, sites saved without fingerprint are not compared
+        self.db_handler.save_password("Site2", self.data_crypto.encrypt_string("new"), fingerprint=self.data_crypto.fingerprint("new"))
+        self.db_handler.save_password("Site3", self.data_crypto.encrypt_string("other"))
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site5"]])
+        self.assertEqual([row.site for row in self.db_handler.iter_rows(without_fingerprint=True, include_reserved=False)],
+                         ["Site3"])
+        # Fingerprints move to the history with the passwords
+        self.assertEqual(list(self.db_handler.iter_history_rows(without_fingerprint=True)), [])
+
+    def test_backfill(self):
+        self._save(fingerprints=False)
+        self.db_handler.save_password("Site1", self.data_crypto.encrypt_string("older"))
+        self.assertEqual(self.db_handler.get_reused(), [])
+
+        stats = backfill_fingerprints(self.db_handler, self.data_crypto, chunk_size=2, workers=0)
+
+        self.assertEqual(stats.rows, 7)
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site3", "Site4"]])
+        self.assertEqual(list(self.db_handler.iter_history_rows(without_fingerprint=True, include_reserved=False)), [])
+        self.assertEqual(backfill_fingerprints(self.db_handler, self.data_crypto, workers=0).rows, 0)
+
+    def test_backfill_in_processes(self):
+        self._save(fingerprints=False)
+        stats = backfill_fingerprints(self.db_handler, self.data_crypto, chunk_size=2, workers=2)
+        self.assertEqual(stats.rows, 6)
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site3", "Site4"]])
+
+    def test_migration_adds_fingerprint(self):
+        legacy_file = NamedTemporaryFile(delete=False)
+        legacy_url = f'sqlite:///{legacy_file.name}'
+        with create_engine(legacy_url).begin() as connection:
+            connection.execute(text("CREATE TABLE pwdata (id INTEGER PRIMARY KEY, site VARCHAR, date VARCHAR, pw BLOB, "
+                                    "timestamp INTEGER)"))
+        db_handler = DBHandler(database_url=legacy_url)
+        self.assertIn("ix_pwdata_fingerprint", {index["name"] for index in inspect(db_handler._engine).get_indexes("pwdata")})
+
+    def test_saved_with_fingerprints(self):
+        import_entries(self.db_handler, self.data_crypto, list(self.passwords.items()), workers=0)
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site3", "Site4"]])
+
+        rekey_vault(self.db_handler, "main_password1!", "new_password2!", workers=0)
+        data_crypto = Vault(self.db_handler).unlock("new_password2!")
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site3", "Site4"]])
+        self.db_handler.save_password("Site1", data_crypto.encrypt_string("other"), fingerprint=data_crypto.fingerprint("other"))
+        self.assertEqual(self.db_handler.get_reused(), [["Site0", "Site2", "Site5"], ["Site1", "Site3", "Site4"]])
+
+        archive_path = NamedTemporaryFile(delete=False).name
+        export_vault(self.db_handler, data_crypto, archive_path, "archive_password1!", kdf_params=KDFParams.generate(1000))
+        other_handler = DBHandler(database_url=f'sqlite:///{NamedTemporaryFile(delete=False).name}')
+        other_crypto = Vault(other_handler).create("main_password1!", iterations=1000)
+        import_vault(other_handler, other_crypto, archive_path, "archive_password1!")
+        # Import saves sites in other order, only the groups are compared
+        self.assertEqual(sorted(other_handler.get_reused()), [["Site0", "Site2", "Site5"], ["Site1", "Site3", "Site4"]])
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.database = f'sqlite:///{self.db_file.name}'
+        self.db_handler = DBHandler(database_url=self.database)
+        self.data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+        self.db_handler.save_password("Site1", self.data_crypto.encrypt_string("secret1"))
+
+    def _run(self, *argv, stdin="main_password1!\n"):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdin", io.StringIO(stdin)), mock.patch("sys.stdout", stdout), \
+                mock.patch("sys.stderr", io.StringIO()):
+            code = cli.main(["--database", self.database, "--password-stdin", *argv])
+        return code, stdout.getvalue().splitlines()
+
+    def test_get(self):
+        self.assertEqual(self._run("get", "Site1"), (0, ["secret1"]))
+        self.assertEqual(self._run("get", "Site1", stdin="main_password2!\n"), (1, []))
+        self.assertEqual(self._run("get", "Site2"), (1, []))
+
+    def test_add_generated_password(self):
+        code, lines = self._run("add", "Site2", "--generate", "--length", "20")
+        self.assertEqual(code, 0)
+        self.assertEqual(len(lines[0]), 20)
+        self.assertEqual(self._run("get", "Site2"), (0, lines))
+        self.assertEqual(self._run("add", "MAINPW", "--generate")[0], 1)
+
+    def test_list(self):
+        self.db_handler.save_password("Other", self.data_crypto.encrypt_string("secret2"))
+        self.assertEqual(self._run("list"), (0, ["Site1", "Other"]))
+        self.assertEqual(self._run("list", "--search", "ite"), (0, ["Site1"]))
+
+    def test_report(self):
+        import json
+        self.db_handler.save_password("Old", self.data_crypto.encrypt_string("secret2"), "01.01.2020-00:00:00")
+        code, lines = self._run("report", stdin="")
+        self.assertEqual(code, 0)
+        self.assertEqual([json.loads(line)["site"] for line in lines], ["Old", "Site1"])
+        self.assertEqual(self._run("report", "--older-than", "365", stdin="")[1], lines[:1])
+        self.assertEqual(self._run("report", "--limit", "1", stdin="")[1], lines[:1])
+
+    def test_import(self):
+        export_path = NamedTemporaryFile("w", suffix=".csv", delete=False).name
+        with open(export_path, "w") as file:
+            file.write("name,password\nSite2,secret2\nSite3,\n")
+        code, lines = self._run("import", export_path, "--workers", "0")
+        self.assertEqual(code, 0)
+        self.assertTrue(lines[0].startswith("Imported 1 passwords (1 skipped)"))
+        self.assertEqual(self._run("get", "Site2"), (0, ["secret2"]))
+        self.assertEqual(self._run("import", export_path, "--format", "jsonl", stdin="main_password2!\n"), (1, []))
+
+    def test_reused(self):
+        self.db_handler.save_password("Site2", self.data_crypto.encrypt_string("secret1"))
+        self.assertEqual(self._run("reused", stdin=""), (0, []))
+        self.assertEqual(self._run("reused", "--backfill"), (0, ["Site1, Site2"]))
+        self.assertEqual(self._run("reused", stdin=""), (0, ["Site1, Site2"]))
+
+    def test_generate(self):
+        code, lines = self._run("generate", "--count", "3", "--length", "8", "--no-symbols")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(len(line) == 8 and line.isalnum() for line in lines))
+
+    def test_cli_does_not_import_gui(self):
+        code = "import sys; from res.cli import main; main(['generate']); print('PySide6' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.splitlines()[-1], "False")
+
+
+class TestResources(unittest.TestCase):
+    def test_rcc_is_up_to_date(self):
+        rcc_file = NamedTemporaryFile(delete=False)
+        rcc_file.close()
+        resources.build_rcc(rcc_file.name)
+        with open(rcc_file.name, "rb") as built, open(resources.RCC_PATH, "rb") as saved:
+            self.assertEqual(built.read(), saved.read())
+
+    def test_load_resources(self):
+        from PySide6.QtCore import QFile
+        self.assertIn(resources.load_resources(), ("rcc", "module"))
+        self.assertTrue(QFile(":/logo/logo.png").exists())
+        self.assertTrue(QFile(":/Button/xbutton.png").exists())
+
+    def test_generated_ui_does_not_import_resources(self):
+        import glob, shutil
+        uic = shutil.which("pyside6-uic")
+        if uic is None:
+            self.skipTest("pyside6-uic is not installed")
+        for ui_path in glob.glob(os.path.join(os.path.dirname(resources.RCC_PATH), "*.ui")):
+            generated = subprocess.run([uic, ui_path], capture_output=True, text=True, check=True).stdout
+            self.assertNotIn("logo_rc", generated, ui_path)
+
+    def test_unknown_mode(self):
+        with mock.patch.object(resources, "_mode", None):
+            with self.assertRaises(ValueError):
+                resources.load_resources("png")
+
+
+class TestSiteListModel(unittest.TestCase):
+    def setUp(self):
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        self.db_handler._save_reserved_password("MAINPW", b"main")
+        self.db_handler.save_passwords((f"Site{i}", b"pw", None) for i in range(5))
+        self.model = SiteListModel(self.db_handler, batch_size=2)
+
+    def test_fetches_page_by_page(self):
+        self.assertEqual(self.model.rowCount(), 0)
+        self.assertTrue(self.model.canFetchMore())
+
+        self.model.fetchMore()
+        self.assertEqual(self.model.rowCount(), 2)
+
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        sites = [self.model.data(self.model.index(row)) for row in range(self.model.rowCount())]
+        self.assertEqual(sites, [f"Site{i}" for i in range(5)])
+
+    def test_fetch_new(self):
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+
+        self.db_handler.save_password("NewSite", b"pw")
+        self.model.fetch_new()
+
+        self.assertEqual(self.model.rowCount(), 6)
+        self.assertEqual(self.model.data(self.model.index(5)), "NewSite")
+
+
+class TestPWManagerWindow(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from PySide6.QtWidgets import QApplication
+        # Without a display QApplication aborts the interpreter
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        from res.gui.gui import PWManagerWindow
+        self.db_file = NamedTemporaryFile(delete=False)
+        self.db_handler = DBHandler(database_url=f'sqlite:///{self.db_file.name}')
+        data_crypto = Vault(self.db_handler).create("main_password1!", iterations=1000)
+        self.db_handler.save_passwords((site, data_crypto.encrypt_string("pw"), None) for site in ("github", "gitlab", "mail"))
+        with mock.patch("res.gui.gui.DBHandler", return_value=self.db_handler):
+            self.window = PWManagerWindow("main_password1!")
+
+    def test_reserved_site_is_not_saved(self):
+        self.window.SiteEdit.setText("MAINKEY")
+        self.window.PasswordEdit.setText("x")
+        with mock.patch("sys.stdout", io.StringIO()):
+            self.window.add_site_button_clicked()
+            self.window.task_runner.wait()
+            self.app.processEvents()
+
+        self.assertTrue(self.window.AddSiteButton.isEnabled())
+        self.assertEqual(Vault(self.db_handler).unlock("main_password1!")._key, self.window.hsh_handle._key)
+
+    def test_search_index_is_built_in_background(self):
+        self.assertIsNone(self.window.site_index)
+
+        self.window.SearchEdit.setText("git")
+        self.window.task_runner.wait()
+        self.app.processEvents()
+
+        self.assertEqual(len(self.window.site_index), 3)
+        self.assertIs(self.window.PasswordView.model(), self.window.search_model)
+        self.assertEqual(sorted(self.window.search_model.stringList()), ["github", "gitlab"])
+
+
 if __name__ == "__main__":
     unittest.main()